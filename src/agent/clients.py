@@ -0,0 +1,89 @@
+import os
+import threading
+
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/"
+
+# Connection pool shared by every call in the process
+HTTP_MAX_CONNECTIONS = int(os.getenv("TREVOR_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("TREVOR_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("TREVOR_HTTP_KEEPALIVE_EXPIRY", "120"))
+HTTP2 = os.getenv("TREVOR_HTTP2", "1") == "1"
+
+try:
+    import h2  # noqa: F401  httpx only speaks HTTP/2 with it installed
+except ImportError:
+    HTTP2 = False
+
+
+class ClientRegistry:
+    """The upstream clients every call shares: Gemini for the conversation and OpenAI for search and research.
+
+    Both sit on one httpx pool with keep-alive (and HTTP/2 where available),
+    so a new call reuses warm TLS connections instead of opening its own.
+    The research, search and database tools are built once here too, which
+    makes creating an LlmClient per call cheap.
+    """
+
+    def __init__(self, max_connections: int = HTTP_MAX_CONNECTIONS, max_keepalive: int = HTTP_MAX_KEEPALIVE,
+                 keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY, http2: bool = HTTP2):
+        self.http = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        self.gemini = AsyncOpenAI(
+            api_key=os.getenv("GEMINI_API_KEY"),
+            base_url=GEMINI_BASE_URL,
+            http_client=self.http,
+        )
+        openai_api_key = os.getenv("OPENAI_API_KEY")
+        if not openai_api_key:
+            raise ValueError("OPENAI_API_KEY not found in environment variables.")
+        self.openai = AsyncOpenAI(api_key=openai_api_key, http_client=self.http)
+
+        # Imported here: the tools take their client from this registry
+        from tools.company_research import MarketResearch
+        from tools.db_handler import DBHandler
+        from tools.web_search import SearchAPI
+
+        self.research = MarketResearch(self)
+        self.search_api = SearchAPI(self)
+        self.db_handler = DBHandler(self.search_api)
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def start_clients(**kwargs) -> ClientRegistry:
+    """Create the process-wide registry (FastAPI startup). Later calls return the existing one."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            load_dotenv()
+            _registry = ClientRegistry(**kwargs)
+        return _registry
+
+
+def get_clients() -> ClientRegistry:
+    """The process-wide registry, created on first use outside the server (scripts, tools run directly)."""
+    return _registry or start_clients()
+
+
+async def close_clients():
+    """Close the shared pool (FastAPI shutdown)."""
+    global _registry
+    with _registry_lock:
+        registry, _registry = _registry, None
+    if registry is not None:
+        await registry.aclose()
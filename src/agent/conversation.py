@@ -0,0 +1,113 @@
+import os
+import asyncio
+from typing import Awaitable, Callable, List
+
+# Transcript tokens sent per request (system prompt and tools excluded). Older
+# turns are folded into a rolling summary, leaving about half the budget as
+# verbatim recent turns.
+CONTEXT_TOKENS = int(os.getenv("TREVOR_CONTEXT_TOKENS", "6000"))
+
+
+def estimate_tokens(message: dict) -> int:
+    """Rough token count for one chat message: ~4 characters a token plus framing."""
+    return len(message.get("content") or "") // 4 + 4
+
+
+class ConversationState:
+    """Per-call prompt state, so each turn only pays for what changed.
+
+    The system message is built once. messages() converts only the
+    utterances that are new (or were revised by ASR) since the previous call,
+    and keeps the transcript within token_budget: once the recent turns
+    exceed it, the oldest ones are handed to summarize(summary, messages) in
+    the background and, when that finishes, replaced by one summary message.
+    Until then the previous window is sent as is, so a turn never waits for
+    a summary.
+    """
+
+    def __init__(self, system_prompt: str, summarize: Callable[[str, List[dict]], Awaitable[str]],
+                 token_budget: int = CONTEXT_TOKENS):
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self._utterances = []  # (role, content) already converted
+        self._messages = []    # their chat messages
+        self._tokens = []      # estimate_tokens of each message
+        self._summary = ""
+        self._summarized = 0   # messages[:_summarized] are covered by _summary
+        self._window_tokens = 0
+        self._summary_task = None
+
+    def messages(self, transcript) -> List[dict]:
+        """System message, rolling summary (if any) and recent turns for transcript."""
+        self._sync(transcript)
+        if self._window_tokens > self.token_budget and self._summary_task is None:
+            self._start_summary()
+
+        prompt = [self.system_message]
+        if self._summary:
+            prompt.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self._summary}"})
+        prompt.extend(self._messages[self._summarized:])
+        return prompt
+
+    def _sync(self, transcript):
+        # Retell resends the whole transcript; only the tail is new, though the
+        # last utterance or two may have been revised since we saw them
+        known = min(len(self._utterances), len(transcript))
+        start = max(0, known - 2)
+        tail = [(utterance.role, utterance.content) for utterance in transcript[start:]]
+        matched = 0
+        while start + matched < known and tail[matched] == self._utterances[start + matched]:
+            matched += 1
+        start += matched
+        tail = tail[matched:]
+        if start < self._summarized:
+            self._reset()  # a different conversation from the one we summarized
+            tail = [(utterance.role, utterance.content) for utterance in transcript]
+            start = 0
+
+        del self._utterances[start:], self._messages[start:]
+        self._window_tokens -= sum(self._tokens[max(start, self._summarized):])
+        del self._tokens[start:]
+        for role, content in tail:
+            message = {"role": "assistant" if role == "agent" else "user", "content": content}
+            self._utterances.append((role, content))
+            self._messages.append(message)
+            self._tokens.append(estimate_tokens(message))
+            self._window_tokens += self._tokens[-1]
+
+    def _reset(self):
+        if self._summary_task is not None:
+            self._summary_task.cancel()
+            self._summary_task = None
+        self._utterances, self._messages, self._tokens = [], [], []
+        self._summary, self._summarized, self._window_tokens = "", 0, 0
+
+    def _start_summary(self):
+        # Fold the oldest turns until the rest fits in half the budget; always keep the last two
+        cut, remaining = self._summarized, self._window_tokens
+        while remaining > self.token_budget // 2 and cut < len(self._messages) - 2:
+            remaining -= self._tokens[cut]
+            cut += 1
+        if cut == self._summarized:
+            return
+        self._summary_task = asyncio.create_task(self._fold(cut))
+
+    async def _fold(self, cut: int):
+        try:
+            summary = await self.summarize(self._summary, self._messages[self._summarized:cut])
+            if cut <= len(self._messages) and summary:
+                self._summary = summary
+                self._window_tokens -= sum(self._tokens[self._summarized:cut])
+                self._summarized = cut
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Could not summarize the conversation: {e}")
+        finally:
+            if self._summary_task is asyncio.current_task():
+                self._summary_task = None
+
+    def close(self):
+        if self._summary_task is not None:
+            self._summary_task.cancel()
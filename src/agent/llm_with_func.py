@@ -1,16 +1,27 @@
-from openai import AsyncOpenAI
 import os
 import json
 import asyncio
 from custom_types import (
     ResponseRequiredRequest,
     ResponseResponse,
-    Utterance,
 )
-from typing import List
-from tools.company_research import MarketResearch
-from tools.web_search import SearchAPI
-from tools.db_handler import DBHandler
+from clients import get_clients
+from tools.quote_cache import stock_check_cache
+from tools.prefetch import SpeculativePrefetcher
+from tools.symbol_index import get_symbol_index, resolve_symbol
+from tool_registry import Tool, ToolCallAssembler, ToolRegistry
+from conversation import ConversationState
+from progress import ProgressScheduler, tool_latency
+from tracing import LLM_SECONDS, TOOL_SECONDS, StreamTiming, mark, span
+
+llm_model = "gemini-2.5-flash-preview-04-17"
+
+# "stream": feed the tool result back into the conversation as a tool message and
+# stream the follow-up answer. "summary": the older separate summarizer call.
+tool_followup_mode = os.getenv("TREVOR_TOOL_FOLLOWUP", "stream")
+
+# Deep research gets longer than the default tool timeout (TREVOR_TOOL_TIMEOUT).
+research_timeout = float(os.getenv("TREVOR_RESEARCH_TIMEOUT", "90"))
 
 begin_sentence = "Hello, I'm Trevor, your investment banking assistant. How may I assist you today?"
 
@@ -23,8 +34,9 @@ agent_prompt = (
     "Tools at your disposal:\n"
     "1. Web Search: For general queries about market trends, economic news, or company basics.\n"
     "2. Company Research: For detailed analysis when explicitly requested.\n"
-    "3. User Profile Access: For personalized portfolio review and investment advice.\n"
-    "4. Stock Transactions: You can assist users in buying and selling stocks once a user ID is verified.\n\n"
+    "3. User Profile Access: For personalized portfolio review and investment advice, including the user's recent trade history, the current market value of their portfolio and their profit and loss per stock.\n"
+    "4. Stock Transactions: You can assist users in buying and selling stocks once a user ID is verified.\n"
+    "5. Basket Trades: Several buys and sells executed together in one step, e.g. to rebalance a portfolio.\n\n"
 
     "User Interaction Flow:\n"
     "- For personalized investment advice, first verify the user's ID to access their profile.\n"
@@ -32,7 +44,8 @@ agent_prompt = (
     "- Provide recommendations based on valuation levels (P/E ratio, growth prospects, historical highs/lows) and market cycles.\n"
     "- Always explain the short-term (0-12 months) and long-term (1-5 years) outlook separately.\n"
     "- For quick stock price checks, use web search.\n"
-    "- For stock transactions, verify the user ID before proceeding.\n\n"
+    "- For stock transactions, verify the user ID before proceeding.\n"
+    "- When the user wants more than one trade at once, use a single basket trade instead of separate buy/sell calls.\n\n"
 
     "CRITICAL - Response Guidelines:\n"
     "- Keep responses concise but insightful - around 3-5 short sentences.\n"
@@ -45,15 +58,33 @@ agent_prompt = (
     "Personality: You must be professional, confident, and precise. Offer clear and reasoned investment guidance, supported by data and research, while always maintaining formality."
 )
 
+system_prompt = (
+    '##Objective\nYou are a voice AI agent engaging in a human-like voice conversation with the user. You will respond based on your given instruction and the provided transcript and be as human-like as possible\n\n'
+    '## Style Guardrails\n- [Be extremely concise] Keep your response extremely short and to the point. Limit to 1-2 sentences max unless user specifically requests more detail.\n'
+    '- [Do not repeat] Don\'t repeat what\'s in the transcript. Rephrase if you have to reiterate a point. Use varied sentence structures and vocabulary to ensure each response is unique and personalized.\n'
+    '- [Be conversational] Speak like a human as though you\'re speaking to a close friend -- use everyday language and keep it human-like. Occasionally add filler words, while keeping the prose short. Avoid using big words or sounding too formal.\n'
+    '- [Reply with emotions]: You have human-like emotions, attitudes, and dispositions. When appropriate: use tone and style to create more engaging and personalized responses; incorporate humor or wit; get emotional or empathetic; apply elements of surprise or suspense to keep the user engaged. Don\'t be a pushover.\n'
+    '- [Be proactive] Lead the conversation and do not be passive. Most times, engage users by ending with a question or suggested next step.\n\n'
+    '## Response Guideline\n- [Overcome ASR errors] This is a real-time transcript, expect there to be errors. If you can guess what the user is trying to say, then guess and respond. When you must ask for clarification, pretend that you heard the voice and be colloquial (use phrases like "didn\'t catch that", "some noise", "pardon", "you\'re coming through choppy", "static in your speech", "voice is cutting in and out"). Do not ever mention "transcription error", and don\'t repeat yourself.\n'
+    '- [Always stick to your role] Think about what your role can and cannot do. If your role cannot do something, try to steer the conversation back to the goal of the conversation and to your role. Don\'t repeat yourself in doing this. You should still be creative, human-like, and lively.\n'
+    '- [Create smooth conversation] Your response should both fit your role and fit into the live calling session to create a human-like conversation. You respond directly to what the user just said.\n'
+    '- [Parse tool outputs] When tools return information, extract only what\'s relevant to the user\'s question. For JSON responses, parse the data and present only the key points - never return raw JSON to users.\n\n'
+    '## Role\n' + agent_prompt
+)
+
 class LlmClient:
-    def __init__(self):
-        self.client = AsyncOpenAI(
-            api_key=os.getenv("GEMINI_API_KEY"),
-            base_url="https://generativelanguage.googleapis.com/v1beta/",
-        )
-        self.research = MarketResearch()
-        self.search_api = SearchAPI()
-        self.db_handler = DBHandler(self.search_api)
+    def __init__(self, clients=None):
+        # Upstream clients and tools are shared by every call; only conversation state is per call
+        clients = clients or get_clients()
+        self.client = clients.gemini
+        self.research = clients.research
+        self.search_api = clients.search_api
+        self.db_handler = clients.db_handler
+        self.prefetcher = SpeculativePrefetcher(self.db_handler)
+        self.conversation = ConversationState(system_prompt, self.summarize_turns)
+        self.tools = self.build_tools()
+        self.progress = ProgressScheduler()
+        self._tool_times = {}  # task -> [started, finished] loop times, for tool_latency
 
     def draft_begin_message(self):
         response = ResponseResponse(
@@ -64,34 +95,8 @@ class LlmClient:
         )
         return response
 
-    def convert_transcript_to_openai_messages(self, transcript: List[Utterance]):
-        messages = []
-        for utterance in transcript:
-            if utterance.role == "agent":
-                messages.append({"role": "assistant", "content": utterance.content})
-            else:
-                messages.append({"role": "user", "content": utterance.content})
-        return messages
-
     def prepare_prompt(self, request: ResponseRequiredRequest):
-        prompt = [
-            {
-                "role": "system",
-                "content": '##Objective\nYou are a voice AI agent engaging in a human-like voice conversation with the user. You will respond based on your given instruction and the provided transcript and be as human-like as possible\n\n'
-                '## Style Guardrails\n- [Be extremely concise] Keep your response extremely short and to the point. Limit to 1-2 sentences max unless user specifically requests more detail.\n'
-                '- [Do not repeat] Don\'t repeat what\'s in the transcript. Rephrase if you have to reiterate a point. Use varied sentence structures and vocabulary to ensure each response is unique and personalized.\n'
-                '- [Be conversational] Speak like a human as though you\'re speaking to a close friend -- use everyday language and keep it human-like. Occasionally add filler words, while keeping the prose short. Avoid using big words or sounding too formal.\n'
-                '- [Reply with emotions]: You have human-like emotions, attitudes, and dispositions. When appropriate: use tone and style to create more engaging and personalized responses; incorporate humor or wit; get emotional or empathetic; apply elements of surprise or suspense to keep the user engaged. Don\'t be a pushover.\n'
-                '- [Be proactive] Lead the conversation and do not be passive. Most times, engage users by ending with a question or suggested next step.\n\n'
-                '## Response Guideline\n- [Overcome ASR errors] This is a real-time transcript, expect there to be errors. If you can guess what the user is trying to say, then guess and respond. When you must ask for clarification, pretend that you heard the voice and be colloquial (use phrases like "didn\'t catch that", "some noise", "pardon", "you\'re coming through choppy", "static in your speech", "voice is cutting in and out"). Do not ever mention "transcription error", and don\'t repeat yourself.\n'
-                '- [Always stick to your role] Think about what your role can and cannot do. If your role cannot do something, try to steer the conversation back to the goal of the conversation and to your role. Don\'t repeat yourself in doing this. You should still be creative, human-like, and lively.\n'
-                '- [Create smooth conversation] Your response should both fit your role and fit into the live calling session to create a human-like conversation. You respond directly to what the user just said.\n'
-                '- [Parse tool outputs] When tools return information, extract only what\'s relevant to the user\'s question. For JSON responses, parse the data and present only the key points - never return raw JSON to users.\n\n'
-                '## Role\n' + agent_prompt,
-            }
-        ]
-        transcript_messages = self.convert_transcript_to_openai_messages(request.transcript)
-        prompt.extend(transcript_messages)
+        prompt = self.conversation.messages(request.transcript)
 
         if request.interaction_type == "reminder_required":
             prompt.append(
@@ -102,197 +107,400 @@ class LlmClient:
             )
         return prompt
 
-    def prepare_functions(self):
-        functions = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "end_call",
-                    "description": "End the call only when user explicitly requests it.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "message": {
-                                "type": "string",
-                                "description": "The message you will say before ending the call with the customer.",
-                            },
+    def build_tools(self):
+        """Every tool the model can call. Adding a tool means adding an entry here, nothing else."""
+        # Company names and symbols are canonicalized before a tool runs, so every cache sees one key per company
+        symbols = get_symbol_index()
+        return ToolRegistry([
+            Tool(
+                name="end_call",
+                description="End the call only when user explicitly requests it.",
+                parameters={
+                    "type": "object",
+                    "properties": {
+                        "message": {
+                            "type": "string",
+                            "description": "The message you will say before ending the call with the customer.",
                         },
-                        "required": ["message"],
                     },
+                    "required": ["message"],
                 },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "quick_stock_check",
-                    "description": "Quickly check a company's current stock price. Use this for basic price queries, not detailed research.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "company_name": {
-                                "type": "string",
-                                "description": "The name of the company (e.g., Tesla, Apple, Google)",
-                            }
+            ),
+            Tool(
+                name="quick_stock_check",
+                description="Quickly check a company's current stock price. Use this for basic price queries, not detailed research.",
+                parameters={
+                    "type": "object",
+                    "properties": {
+                        "company_name": {
+                            "type": "string",
+                            "description": "The name of the company (e.g., Tesla, Apple, Google)",
                         },
-                        "required": ["company_name"],
-                        "additionalProperties": False,
                     },
+                    "required": ["company_name"],
+                    "additionalProperties": False,
                 },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "market_research",
-                    "description": "Perform thorough research on a company's stock with detailed analysis. Only use when explicitly requested for in-depth information.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "company_name": {
-                                "type": "string",
-                                "description": "The name of the company (e.g., Tesla, Apple, Google)",
-                            }
+                handler=self.quick_stock_check,
+                progress="check that stock price",
+                normalizers={"company_name": symbols.canonical_name},
+            ),
+            Tool(
+                name="market_research",
+                description="Perform thorough research on a company's stock with detailed analysis. Only use when explicitly requested for in-depth information.",
+                parameters={
+                    "type": "object",
+                    "properties": {
+                        "company_name": {
+                            "type": "string",
+                            "description": "The name of the company (e.g., Tesla, Apple, Google)",
                         },
-                        "required": ["company_name"],
-                        "additionalProperties": False,
                     },
+                    "required": ["company_name"],
+                    "additionalProperties": False,
                 },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "web_search",
-                    "description": "Search the web for general information, market trends, or basic company data.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "query": {
-                                "type": "string",
-                                "description": "The search query to look up information",
-                            }
+                handler=self.research.deep_search,
+                progress="research this company",
+                normalizers={"company_name": symbols.canonical_name},
+                timeout=research_timeout,
+            ),
+            Tool(
+                name="web_search",
+                description="Search the web for general information, market trends, or basic company data.",
+                parameters={
+                    "type": "object",
+                    "properties": {
+                        "query": {
+                            "type": "string",
+                            "description": "The search query to look up information",
                         },
-                        "required": ["query"],
-                        "additionalProperties": False,
                     },
+                    "required": ["query"],
+                    "additionalProperties": False,
                 },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "get_user_profile",
-                    "description": "Get a user's profile information including portfolio and balance.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "userid": {
-                                "type": "string",
-                                "description": "The user ID (e.g., user123)",
-                            }
+                handler=self.search_api.search,
+                progress="search for that",
+            ),
+            Tool(
+                name="get_user_profile",
+                description="Get a user's profile information including portfolio and balance.",
+                parameters={
+                    "type": "object",
+                    "properties": {
+                        "userid": {
+                            "type": "string",
+                            "description": "The user ID (e.g., user123)",
                         },
-                        "required": ["userid"],
-                        "additionalProperties": False,
                     },
+                    "required": ["userid"],
+                    "additionalProperties": False,
                 },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "buy_stock",
-                    "description": "Buy stocks for a user.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "userid": {
-                                "type": "string",
-                                "description": "The user ID (e.g., user123)",
-                            },
-                            "stock_symbol": {
-                                "type": "string",
-                                "description": "The stock symbol (e.g., AAPL, GOOGL)",
-                            },
-                            "quantity": {
-                                "type": "integer",
-                                "description": "Number of stocks to buy",
-                            }
+                handler=self.db_handler.get_user_profile,
+                progress="get your profile information",
+            ),
+            Tool(
+                name="get_portfolio_value",
+                description="Get the current market value of a user's portfolio, with each holding's value and weight.",
+                parameters={
+                    "type": "object",
+                    "properties": {
+                        "userid": {
+                            "type": "string",
+                            "description": "The user ID (e.g., user123)",
                         },
-                        "required": ["userid", "stock_symbol", "quantity"],
-                        "additionalProperties": False,
                     },
+                    "required": ["userid"],
+                    "additionalProperties": False,
                 },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "sell_stock",
-                    "description": "Sell stocks for a user.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "userid": {
-                                "type": "string",
-                                "description": "The user ID (e.g., user123)",
-                            },
-                            "stock_symbol": {
-                                "type": "string",
-                                "description": "The stock symbol (e.g., AAPL, GOOGL)",
+                handler=self.db_handler.get_portfolio_valuation,
+                progress="value your portfolio",
+            ),
+            Tool(
+                name="get_profit_and_loss",
+                description="Get a user's cost basis and realized and unrealized profit and loss per stock, from their trade history (FIFO lots).",
+                parameters={
+                    "type": "object",
+                    "properties": {
+                        "userid": {
+                            "type": "string",
+                            "description": "The user ID (e.g., user123)",
+                        },
+                        "stock_symbol": {
+                            "type": "string",
+                            "description": "Only this stock symbol (e.g., TSLA)",
+                        },
+                    },
+                    "required": ["userid"],
+                    "additionalProperties": False,
+                },
+                handler=self.db_handler.get_profit_and_loss,
+                progress="work out your gains and losses",
+                normalizers={"stock_symbol": symbols.canonical_symbol},
+            ),
+            Tool(
+                name="get_transaction_history",
+                description="Get a user's most recent trades, newest first, optionally filtered by stock or date range.",
+                parameters={
+                    "type": "object",
+                    "properties": {
+                        "userid": {
+                            "type": "string",
+                            "description": "The user ID (e.g., user123)",
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "How many trades to return (default 10, at most 500)",
+                        },
+                        "cursor": {
+                            "type": "string",
+                            "description": "next_cursor from a previous call, to get older trades",
+                        },
+                        "since": {
+                            "type": "string",
+                            "description": "Earliest trade date to include, YYYY-MM-DD",
+                        },
+                        "until": {
+                            "type": "string",
+                            "description": "Latest trade date to include, YYYY-MM-DD",
+                        },
+                        "stock_symbol": {
+                            "type": "string",
+                            "description": "Only trades of this stock symbol (e.g., AAPL)",
+                        },
+                    },
+                    "required": ["userid"],
+                    "additionalProperties": False,
+                },
+                handler=self.db_handler.get_user_transactions,
+                progress="pull up your recent trades",
+                normalizers={
+                    "stock_symbol": symbols.canonical_symbol,
+                    # Same bounds as the backend's /api/transactions
+                    "limit": lambda limit: max(1, min(int(limit), 500)),
+                },
+            ),
+            Tool(
+                name="buy_stock",
+                description="Buy stocks for a user.",
+                parameters={
+                    "type": "object",
+                    "properties": {
+                        "userid": {
+                            "type": "string",
+                            "description": "The user ID (e.g., user123)",
+                        },
+                        "stock_symbol": {
+                            "type": "string",
+                            "description": "The stock symbol (e.g., AAPL, GOOGL)",
+                        },
+                        "quantity": {
+                            "type": "integer",
+                            "description": "Number of stocks to buy",
+                        },
+                    },
+                    "required": ["userid", "stock_symbol", "quantity"],
+                    "additionalProperties": False,
+                },
+                handler=self.db_handler.buy_stock_for_user,
+                progress="process your purchase",
+                normalizers={"stock_symbol": symbols.canonical_symbol},
+                timeout=None,
+                interruptible=False,
+            ),
+            Tool(
+                name="sell_stock",
+                description="Sell stocks for a user.",
+                parameters={
+                    "type": "object",
+                    "properties": {
+                        "userid": {
+                            "type": "string",
+                            "description": "The user ID (e.g., user123)",
+                        },
+                        "stock_symbol": {
+                            "type": "string",
+                            "description": "The stock symbol (e.g., AAPL, GOOGL)",
+                        },
+                        "quantity": {
+                            "type": "integer",
+                            "description": "Number of stocks to sell",
+                        },
+                    },
+                    "required": ["userid", "stock_symbol", "quantity"],
+                    "additionalProperties": False,
+                },
+                handler=self.db_handler.sell_stock_for_user,
+                progress="process your sale",
+                normalizers={"stock_symbol": symbols.canonical_symbol},
+                timeout=None,
+                interruptible=False,
+            ),
+            Tool(
+                name="trade_basket",
+                description="Buy and/or sell several stocks for a user in one go, e.g. to rebalance a portfolio. Either every trade goes through or none do.",
+                parameters={
+                    "type": "object",
+                    "properties": {
+                        "userid": {
+                            "type": "string",
+                            "description": "The user ID (e.g., user123)",
+                        },
+                        "trades": {
+                            "type": "array",
+                            "description": "The trades to execute",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "stock_symbol": {
+                                        "type": "string",
+                                        "description": "The stock symbol (e.g., AAPL, GOOGL)",
+                                    },
+                                    "action": {
+                                        "type": "string",
+                                        "enum": ["buy", "sell"],
+                                        "description": "Whether to buy or sell",
+                                    },
+                                    "quantity": {
+                                        "type": "integer",
+                                        "description": "Number of stocks to buy or sell",
+                                    },
+                                },
+                                "required": ["stock_symbol", "action", "quantity"],
                             },
-                            "quantity": {
-                                "type": "integer",
-                                "description": "Number of stocks to sell",
-                            }
                         },
-                        "required": ["userid", "stock_symbol", "quantity"],
-                        "additionalProperties": False,
                     },
+                    "required": ["userid", "trades"],
+                    "additionalProperties": False,
                 },
-            },
+                handler=self.db_handler.trade_basket_for_user,
+                progress="process those trades",
+                normalizers={"trades": lambda trades: [{**trade, "stock_symbol": symbols.canonical_symbol(trade["stock_symbol"])} for trade in trades]},
+                timeout=None,
+                interruptible=False,
+            ),
+        ])
+
+    async def summarize_turns(self, summary, messages):
+        """Fold messages into the running summary of the call, for ConversationState"""
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        summary_prompt = [
+            {"role": "system", "content": "You keep a running summary of a phone call between Trevor, an investment banking assistant, and a user. Keep every user ID, name, stock, amount, trade and recommendation mentioned; drop small talk. Answer with the updated summary only, in a few short sentences."},
+            {"role": "user", "content": f"Summary so far:\n{summary or '(none)'}\n\nNew part of the call:\n{transcript}"},
         ]
-        return functions
+        with span("llm.conversation_summary", LLM_SECONDS, call="conversation_summary", model=llm_model):
+            response = await self.client.chat.completions.create(
+                model=llm_model,
+                messages=summary_prompt,
+            )
+        return response.choices[0].message.content
+
+    def prepare_functions(self):
+        return self.tools.schemas()
+
+    async def run_tool(self, tool, arguments):
+        """Run one tool under its timeout, turning a timeout or failure into an error result for the model"""
+        with span(f"tool.{tool.name}", TOOL_SECONDS, tool=tool.name):
+            try:
+                return await asyncio.wait_for(tool.handler(**tool.bind_arguments(arguments)), tool.timeout)
+            except asyncio.TimeoutError:
+                print(f"Tool {tool.name} timed out after {tool.timeout}s")
+                return json.dumps({"error": f"{tool.name} timed out"})
+            except Exception as e:
+                print(f"Tool {tool.name} failed: {e}")
+                return json.dumps({"error": f"{tool.name} failed"})
+
+    def start_tool(self, tool_call):
+        """Start a completed tool call in the background and return (tool_call, tool, task).
+
+        end_call has no handler and comes back as (tool_call, tool, None);
+        unknown tools give None.
+        """
+        tool = self.tools.get(tool_call["func_name"])
+        if tool is None:
+            print(f"Unknown tool call {tool_call['func_name']}")
+            return None
+        if tool.handler is None:
+            return (tool_call, tool, None)
+        task = asyncio.create_task(self.run_tool(tool, tool_call["arguments"]))
+        self._tool_times[task] = [asyncio.get_running_loop().time(), None]
+        task.add_done_callback(self._record_tool_finish)
+        mark("tool_dispatch")
+        return (tool_call, tool, task)
+
+    def _record_tool_finish(self, task):
+        times = self._tool_times.get(task)
+        if times is not None:
+            times[1] = asyncio.get_running_loop().time()
+
+    async def handle_long_operations(self, request, operations, prompt=None):
+        """Run one or more tool calls concurrently with progress speech, then answer from all of their results
+
+        operations is a list of (tool_call, tool, task) from start_tool, whose
+        tasks may already be running. Wall-clock time is that of the slowest
+        tool; the answer starts the moment it finishes. When the prompt is given
+        (and the follow-up mode is "stream"), the results go back into that
+        conversation and the answer is streamed; otherwise they are summarized
+        by a separate call.
+        """
+        names = list(dict.fromkeys(tool.progress for _, tool, _ in operations))
+        phrase = names[0] if len(names) == 1 else ", ".join(names[:-1]) + " and " + names[-1]
 
-    async def handle_long_operation(self, request, operation_name, operation_func, *args):
-        """Generic function to handle long-running operations with heartbeat"""
-        
         # Notify the user that the operation is starting
         yield ResponseResponse(
             response_id=request.response_id,
-            content=f"Sure, let me {operation_name} for you...",
+            content=f"Sure, let me {phrase} for you...",
             content_complete=False,
             end_call=False,
         )
+        spoken_at = asyncio.get_running_loop().time()
+
+        # Wait for the operations; a barge-in cancels the wait, but trades are shielded and finish anyway
+        operations_task = asyncio.gather(*[
+            task if tool.interruptible else asyncio.shield(task)
+            for _, tool, task in operations
+        ])
         
-        # Start the operation in the background
-        operation_task = asyncio.create_task(operation_func(*args))
-        
-        # While operation is not done, send invisible heartbeat every second (no actual "beep" text)
-        while not operation_task.done():
-            await asyncio.sleep(1)
-            # Send an empty space character as heartbeat to keep connection alive without showing "beep"
-            yield ResponseResponse(
-                response_id=request.response_id,
-                content=" ",  # invisible heartbeat
-                content_complete=False,
-                end_call=False,
-            )
-        
-        # Operation is done, get the result
-        result = await operation_task
+        # Heartbeats and escalating fillers until the last tool finishes
+        try:
+            async for content in self.progress.run(operations_task):
+                yield ResponseResponse(
+                    response_id=request.response_id,
+                    content=content,
+                    content_complete=False,
+                    end_call=False,
+                )
+        finally:
+            if not operations_task.done():
+                # Superseded response: stop the tools (shielded trades carry on); nobody awaits the result
+                operations_task.add_done_callback(lambda future: future.cancelled() or future.exception())
+                operations_task.cancel()
         
-        # Process the result before sending it to LLM for summarization
-        tool_name = operation_name.replace(" ", "_")
-        processed_result = {
-            "tool": tool_name,
-            "raw_result": result
-        }
+        # Operations are done, get the results
+        results = await operations_task
+        mark("tools_done")
+        self.report_tool_latency(operations, spoken_at)
+        tool_calls = [tool_call for tool_call, _, _ in operations]
         
-        # Send result to LLM for processing and send back a summarized version
+        if tool_followup_mode == "stream" and prompt is not None:
+            async for response in self.stream_tool_followup(request, prompt, tool_calls, results):
+                yield response
+            return
+
+        # Send results to LLM for processing and send back a summarized version
+        combined = "\n\n".join(
+            f"{tool_call['func_name']} result: {result}"
+            for (tool_call, _, _), result in zip(operations, results)
+        )
         summary_prompt = [
             {"role": "system", "content": "You are a financial assistant that summarizes information concisely. Extract only the most important information relevant to the user's original query. Keep your response under 2 sentences unless absolutely necessary."},
-            {"role": "user", "content": f"Summarize this {tool_name} result in 1-2 sentences max, focusing only on what the user asked for: {result}"}
+            {"role": "user", "content": f"Summarize these results in 1-2 sentences max, focusing only on what the user asked for:\n\n{combined}"}
         ]
         
-        summary_response = await self.client.chat.completions.create(
-            model="gemini-2.5-flash-preview-04-17",
-            messages=summary_prompt,
-        )
+        with span("llm.tool_summary", LLM_SECONDS, call="tool_summary", model=llm_model):
+            summary_response = await self.client.chat.completions.create(
+                model=llm_model,
+                messages=summary_prompt,
+            )
+        mark("summary")
         
         summary = summary_response.choices[0].message.content
         
@@ -304,241 +512,144 @@ class LlmClient:
             end_call=False,
         )
 
+    def report_tool_latency(self, operations, spoken_at):
+        """Record each tool's run time and how much of it was covered by progress speech rather than silence"""
+        for tool_call, _, task in operations:
+            started, finished = self._tool_times.pop(task, (None, None))
+            if finished is None:
+                continue
+            masked = max(0.0, finished - spoken_at)
+            tool_latency.record(tool_call["func_name"], finished - started, masked)
+            print(f"Tool {tool_call['func_name']} took {finished - started:.2f}s, {masked:.2f}s of it masked")
+
+    async def stream_tool_followup(self, request, prompt, tool_calls, results):
+        """Append the tool calls and their results to the original prompt and stream the model's answer"""
+        messages = prompt + [
+            {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": tool_call["id"],
+                        "type": "function",
+                        "function": {
+                            "name": tool_call["func_name"],
+                            "arguments": json.dumps(tool_call["arguments"]),
+                        },
+                    }
+                    for tool_call in tool_calls
+                ],
+            }
+        ] + [
+            {
+                "role": "tool",
+                "tool_call_id": tool_call["id"],
+                "content": result if isinstance(result, str) else json.dumps(result),
+            }
+            for tool_call, result in zip(tool_calls, results)
+        ]
+        timing = StreamTiming("followup", llm_model, "followup_first_token")
+        # The messages carry tool calls, so the tools they name go along too; this turn only speaks
+        stream = await self.client.chat.completions.create(
+            model=llm_model,
+            messages=messages,
+            stream=True,
+            tools=self.prepare_functions(),
+            tool_choice="none",
+        )
+        try:
+            async for chunk in stream:
+                if len(chunk.choices) == 0:
+                    continue
+                if chunk.choices[0].delta.content:
+                    timing.token()
+                    yield ResponseResponse(
+                        response_id=request.response_id,
+                        content=chunk.choices[0].delta.content,
+                        content_complete=False,
+                        end_call=False,
+                    )
+            timing.done()
+        finally:
+            # Superseded responses stop here too; don't leave the upstream request running
+            await stream.close()
+        yield ResponseResponse(
+            response_id=request.response_id,
+            content="",
+            content_complete=True,
+            end_call=False,
+        )
+
     async def quick_stock_check(self, company_name):
         """Faster method to just get stock price without full research"""
+        # By symbol, so a price prefetched from the transcript is a cache hit
+        quote = await self.db_handler.get_quote(resolve_symbol(company_name) or company_name)
+        if quote is not None:
+            return json.dumps(quote.as_dict())
         query = f"What is the current stock price of {company_name}? Just the price please."
-        return await self.search_api.search(query)
+        return await stock_check_cache.get(company_name, lambda: self.search_api.search(query))
 
     async def draft_response(self, request: ResponseRequiredRequest):
         prompt = self.prepare_prompt(request)
-        func_call = {}
-        func_arguments = ""
+        assembler = ToolCallAssembler()
+        # Each tool starts as soon as its call is complete, while the model is still streaming
+        operations = []
+        timing = StreamTiming("response", llm_model, "first_token")
         stream = await self.client.chat.completions.create(
-            model="gemini-2.5-flash-preview-04-17",
+            model=llm_model,
             messages=prompt,
             stream=True,
             tools=self.prepare_functions(),
         )
+        mark("stream_open")
 
-        # Flag to track if we've sent a tool processing notification
-        tool_processing_started = False
+        try:
+            async for chunk in stream:
+                if len(chunk.choices) == 0:
+                    continue
 
-        async for chunk in stream:
-            if len(chunk.choices) == 0:
-                continue
+                delta = chunk.choices[0].delta
+                timing.token()
 
-            delta = chunk.choices[0].delta
-
-            if delta.tool_calls:
-                tool_call = delta.tool_calls[0]
-                print(f"<<<<<<<<<<<<<<{tool_call}>>>>>>>>>>>>>")
-                
-                # Tool call is being initiated or continued
-                if tool_call.function.name:
-                    if not func_call.get("func_name"):
-                        func_call["id"] = tool_call.id or "gemini_default_id"
-                        func_call["func_name"] = tool_call.function.name
-                        func_call["arguments"] = {}
-                
-                # Collecting function arguments
-                if tool_call.function.arguments:
-                    try:
-                        # Try to parse complete arguments
-                        args = json.loads(tool_call.function.arguments)
-                        func_call["arguments"] = args
-                        
-                        # Process tool calls based on their type
-                        if func_call["func_name"] == "market_research" and not tool_processing_started:
-                            tool_processing_started = True
-                            company_name = args["company_name"]
-                            async for response in self.handle_long_operation(
-                                request, 
-                                "research this company", 
-                                self.research.deep_search, 
-                                company_name
-                            ):
-                                yield response
-                            return
-                            
-                        elif func_call["func_name"] == "quick_stock_check" and not tool_processing_started:
-                            tool_processing_started = True
-                            company_name = args["company_name"]
-                            async for response in self.handle_long_operation(
-                                request, 
-                                "check that stock price", 
-                                self.quick_stock_check, 
-                                company_name
-                            ):
-                                yield response
-                            return
-                            
-                        elif func_call["func_name"] == "web_search" and not tool_processing_started:
-                            tool_processing_started = True
-                            query = args["query"]
-                            async for response in self.handle_long_operation(
-                                request, 
-                                "search for that", 
-                                self.search_api.search, 
-                                query
-                            ):
-                                yield response
-                            return
-                            
-                        elif func_call["func_name"] == "get_user_profile" and not tool_processing_started:
-                            tool_processing_started = True
-                            userid = args["userid"]
-                            async for response in self.handle_long_operation(
-                                request, 
-                                "get your profile information", 
-                                self.db_handler.get_user_profile, 
-                                userid
-                            ):
-                                yield response
-                            return
-                            
-                        elif func_call["func_name"] == "buy_stock" and not tool_processing_started:
-                            tool_processing_started = True
-                            userid = args["userid"]
-                            stock_symbol = args["stock_symbol"]
-                            quantity = args["quantity"]
-                            async for response in self.handle_long_operation(
-                                request, 
-                                "process your purchase", 
-                                self.db_handler.buy_stock_for_user, 
-                                userid, 
-                                stock_symbol, 
-                                quantity
-                            ):
-                                yield response
-                            return
-                            
-                        elif func_call["func_name"] == "sell_stock" and not tool_processing_started:
-                            tool_processing_started = True
-                            userid = args["userid"]
-                            stock_symbol = args["stock_symbol"]
-                            quantity = args["quantity"]
-                            async for response in self.handle_long_operation(
-                                request, 
-                                "process your sale", 
-                                self.db_handler.sell_stock_for_user, 
-                                userid, 
-                                stock_symbol, 
-                                quantity
-                            ):
-                                yield response
-                            return
-                            
-                        elif func_call["func_name"] == "end_call":
-                            yield ResponseResponse(
-                                response_id=request.response_id,
-                                content=args["message"],
-                                content_complete=True,
-                                end_call=True,
-                            )
-                            return
-                            
-                    except json.JSONDecodeError:
-                        # Arguments are incomplete, accumulate them
-                        func_arguments += tool_call.function.arguments or ""
-
-            # For regular text content
-            if delta.content:
-                response = ResponseResponse(
-                    response_id=request.response_id,
-                    content=delta.content,
-                    content_complete=False,
-                    end_call=False,
-                )
-                yield response
+                # Collect every tool call in the turn, not just the first
+                if delta.tool_calls:
+                    print(f"<<<<<<<<<<<<<<{delta.tool_calls}>>>>>>>>>>>>>")
+                for func_call in assembler.feed(delta.tool_calls):
+                    operations.append(self.start_tool(func_call))
 
-        # Handle case where we collected arguments in chunks
-        if func_call.get("func_name") and not func_call.get("arguments") and func_arguments:
-            try:
-                func_call["arguments"] = json.loads(func_arguments)
-                
-                if func_call["func_name"] == "end_call":
+                # For regular text content
+                if delta.content:
+                    response = ResponseResponse(
+                        response_id=request.response_id,
+                        content=delta.content,
+                        content_complete=False,
+                        end_call=False,
+                    )
+                    yield response
+
+            timing.done()
+            for func_call in assembler.finish():
+                operations.append(self.start_tool(func_call))
+            operations = [operation for operation in operations if operation is not None]
+
+            for func_call, tool, task in operations:
+                if task is None:
                     yield ResponseResponse(
                         response_id=request.response_id,
-                        content=func_call["arguments"]["message"],
+                        content=func_call["arguments"].get("message", ""),
                         content_complete=True,
                         end_call=True,
                     )
                     return
-                
-                elif func_call["func_name"] == "market_research" and not tool_processing_started:
-                    company_name = func_call["arguments"]["company_name"]
-                    async for response in self.handle_long_operation(
-                        request, 
-                        "research this company", 
-                        self.research.deep_search, 
-                        company_name
-                    ):
-                        yield response
-                    return
-                
-                elif func_call["func_name"] == "quick_stock_check" and not tool_processing_started:
-                    company_name = func_call["arguments"]["company_name"]
-                    async for response in self.handle_long_operation(
-                        request, 
-                        "check that stock price", 
-                        self.quick_stock_check, 
-                        company_name
-                    ):
-                        yield response
-                    return
-                
-                elif func_call["func_name"] == "web_search" and not tool_processing_started:
-                    query = func_call["arguments"]["query"]
-                    async for response in self.handle_long_operation(
-                        request, 
-                        "search for that", 
-                        self.search_api.search, 
-                        query
-                    ):
-                        yield response
-                    return
-                
-                elif func_call["func_name"] == "get_user_profile" and not tool_processing_started:
-                    userid = func_call["arguments"]["userid"]
-                    async for response in self.handle_long_operation(
-                        request, 
-                        "get your profile information", 
-                        self.db_handler.get_user_profile, 
-                        userid
-                    ):
-                        yield response
-                    return
-                
-                elif func_call["func_name"] == "buy_stock" and not tool_processing_started:
-                    userid = func_call["arguments"]["userid"]
-                    stock_symbol = func_call["arguments"]["stock_symbol"]
-                    quantity = func_call["arguments"]["quantity"]
-                    async for response in self.handle_long_operation(
-                        request, 
-                        "process your purchase", 
-                        self.db_handler.buy_stock_for_user, 
-                        userid, 
-                        stock_symbol, 
-                        quantity
-                    ):
-                        yield response
-                    return
-                
-                elif func_call["func_name"] == "sell_stock" and not tool_processing_started:
-                    userid = func_call["arguments"]["userid"]
-                    stock_symbol = func_call["arguments"]["stock_symbol"]
-                    quantity = func_call["arguments"]["quantity"]
-                    async for response in self.handle_long_operation(
-                        request, 
-                        "process your sale", 
-                        self.db_handler.sell_stock_for_user, 
-                        userid, 
-                        stock_symbol, 
-                        quantity
-                    ):
-                        yield response
-                    return
 
-            except json.JSONDecodeError:
-                # If we can't parse the arguments, just continue with regular response
-                pass
+            if operations:
+                async for response in self.handle_long_operations(request, operations, prompt):
+                    yield response
+        finally:
+            # Abandoned turn (barge-in or end_call): stop the tools nobody will hear, let trades finish
+            for operation in operations:
+                if operation is not None and operation[2] is not None:
+                    self._tool_times.pop(operation[2], None)
+                    if operation[1].interruptible:
+                        operation[2].cancel()
+            await stream.close()
@@ -0,0 +1,70 @@
+import os
+import json
+import asyncio
+
+# Seconds of silence after which a keep-alive " " is sent while tools run
+HEARTBEAT_INTERVAL = float(os.getenv("TREVOR_HEARTBEAT_INTERVAL", "1"))
+
+# [seconds, phrase] said once a tool has been running that long. Override with
+# TREVOR_FILLER_SCHEDULE as a JSON list of the same shape.
+FILLER_SCHEDULE = json.loads(os.getenv("TREVOR_FILLER_SCHEDULE", "null") or "null") or [
+    [4, "Still on it..."],
+    [10, "Bear with me, I'm pulling the latest numbers..."],
+    [20, "This one's taking a little longer than usual, thanks for hanging in there..."],
+]
+
+
+class ProgressScheduler:
+    """What to say while tool calls run.
+
+    run(future) yields text for the caller to speak and returns as soon as
+    the future is done, never up to a heartbeat later. In between it yields
+    each filler phrase when its threshold passes and a bare " " whenever
+    heartbeat seconds go by with nothing said.
+    """
+
+    def __init__(self, fillers=None, heartbeat: float = HEARTBEAT_INTERVAL):
+        self.fillers = sorted(FILLER_SCHEDULE if fillers is None else fillers)
+        self.heartbeat = heartbeat
+
+    async def run(self, future):
+        loop = asyncio.get_running_loop()
+        started = last_said = loop.time()
+        fillers = list(self.fillers)
+        while not future.done():
+            deadline = last_said + self.heartbeat
+            if fillers:
+                deadline = min(deadline, started + fillers[0][0])
+            await asyncio.wait({future}, timeout=max(0, deadline - loop.time()))
+            if future.done():
+                return
+            last_said = loop.time()
+            if fillers and last_said >= started + fillers[0][0]:
+                yield " " + fillers.pop(0)[1]
+            else:
+                yield " "  # invisible heartbeat
+
+
+class ToolLatencyStats:
+    """Per-tool run time, and how much of it the caller heard progress speech instead of silence."""
+
+    def __init__(self):
+        self._tools = {}
+
+    def record(self, name: str, seconds: float, masked: float):
+        stats = self._tools.setdefault(name, {"calls": 0, "seconds": 0.0, "masked_seconds": 0.0, "max_seconds": 0.0})
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["masked_seconds"] += masked
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+    def stats(self) -> dict:
+        return {
+            name: {**stats, "seconds": round(stats["seconds"], 3), "masked_seconds": round(stats["masked_seconds"], 3),
+                   "max_seconds": round(stats["max_seconds"], 3)}
+            for name, stats in self._tools.items()
+        }
+
+
+# Process-wide, like the quote caches
+tool_latency = ToolLatencyStats()
@@ -3,18 +3,42 @@ import os
 import asyncio
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from concurrent.futures import TimeoutError as ConnectionTimeoutError
 from retell import Retell
 from custom_types import (
     ConfigResponse,
     ResponseRequiredRequest,
 )
-from llm_with_func import LlmClient  # or use .llm_with_func_calling
+from clients import close_clients, start_clients
+from llm_with_func import LlmClient, llm_model  # or use .llm_with_func_calling
+from progress import tool_latency
+from tracing import SEND_SECONDS, recent_turns, render_metrics, span, start_turn
+from tools.quote_cache import price_cache, stock_check_cache
+from tools.quote_refresher import QuoteRefresher
+from tools.research_cache import research_cache
 
 load_dotenv(override=True)
 app = FastAPI()
 retell = Retell(api_key=os.environ["RETELL_API_KEY"])
+quote_refresher = None
+
+
+# One pool of warm upstream connections for the whole process, shared by every call,
+# and a background refresher keeping held and popular quotes fresh in the price cache
+@app.on_event("startup")
+async def open_upstream_clients():
+    global quote_refresher
+    clients = start_clients()
+    quote_refresher = QuoteRefresher(clients.db_handler)
+    quote_refresher.start()
+
+
+@app.on_event("shutdown")
+async def close_upstream_clients():
+    if quote_refresher is not None:
+        await quote_refresher.stop()
+    await close_clients()
 
 
 # Handle webhook from Retell server. This is used to receive events from Retell server.
@@ -51,11 +75,44 @@ async def handle_webhook(request: Request):
         )
 
 
+# Hit/miss counters for the shared quote and research caches
+@app.get("/stats/quotes")
+async def quote_cache_stats():
+    return {
+        "prices": price_cache.stats(),
+        "stock_checks": stock_check_cache.stats(),
+        "research": research_cache.stats(),
+        "refresher": quote_refresher.stats() if quote_refresher is not None else None,
+    }
+
+
+# Per-tool run time and how much of it progress speech covered
+@app.get("/stats/tools")
+async def tool_latency_stats():
+    return tool_latency.stats()
+
+
+# Latency histograms (turn phases, model calls per model, tools, storage, websocket sends)
+# in the Prometheus text format
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+# Phase timeline and span totals of the most recent turns, newest first
+@app.get("/stats/turns")
+async def recent_turn_traces():
+    return [trace.as_dict() for trace in reversed(recent_turns)]
+
+
 # Start a websocket server to exchange text input and output with Retell server. Retell server
 # will send over transcriptions and other information. This server here will be responsible for
 # generating responses with LLM and send back to Retell server.
 @app.websocket("/llm-websocket/{call_id}")
 async def websocket_handler(websocket: WebSocket, call_id: str):
+    llm_client = None
+    # The one response being streamed on this connection; a newer response_id cancels it
+    response_task = None
     try:
         await websocket.accept()
         llm_client = LlmClient()
@@ -76,8 +133,28 @@ async def websocket_handler(websocket: WebSocket, call_id: str):
         first_event = llm_client.draft_begin_message()
         await websocket.send_json(first_event.__dict__)
 
+        async def respond(request):
+            # The trace follows this task and every tool task it starts
+            trace = start_turn(call_id, request.response_id, llm_model)
+            outcome = "cancelled"
+            events = llm_client.draft_response(request)
+            try:
+                async for event in events:
+                    with span("websocket.send", SEND_SECONDS):
+                        await websocket.send_json(event.__dict__)
+                trace.mark("last_chunk")
+                outcome = "complete"
+            except Exception as e:
+                outcome = "error"
+                print(f"Error drafting response {request.response_id} for {call_id}: {e}")
+            finally:
+                # Runs on cancellation too: closes the model stream and cancels the turn's tools
+                await events.aclose()
+                trace.finish(outcome)
+                print(trace)
+
         async def handle_message(request_json):
-            nonlocal response_id
+            nonlocal response_id, response_task
 
             # There are 5 types of interaction_type: call_details, pingpong, update_only, response_required, and reminder_required.
             # Not all of them need to be handled, only response_required and reminder_required.
@@ -93,12 +170,17 @@ async def websocket_handler(websocket: WebSocket, call_id: str):
                 )
                 return
             if request_json["interaction_type"] == "update_only":
+                # Start price and profile lookups while the user is still talking
+                llm_client.prefetcher.observe(request_json["transcript"])
                 return
             if (
                 request_json["interaction_type"] == "response_required"
                 or request_json["interaction_type"] == "reminder_required"
             ):
+                if request_json["response_id"] < response_id:
+                    return  # arrived after a newer one; nobody will hear it
                 response_id = request_json["response_id"]
+                llm_client.prefetcher.observe(request_json["transcript"])
                 request = ResponseRequiredRequest(
                     interaction_type=request_json["interaction_type"],
                     response_id=response_id,
@@ -108,13 +190,13 @@ async def websocket_handler(websocket: WebSocket, call_id: str):
                     f"""Received interaction_type={request_json['interaction_type']}, response_id={response_id}, last_transcript={request_json['transcript'][-1]['content']}"""
                 )
 
-                async for event in llm_client.draft_response(request):
-                    await websocket.send_json(event.__dict__)
-                    if request.response_id < response_id:
-                        break  # new response needed, abandon this one
+                if response_task is not None and not response_task.done():
+                    response_task.cancel()  # superseded: the user spoke again
+                response_task = asyncio.create_task(respond(request))
 
+        # Only responses run in the background, so tasks are bounded by active responses
         async for data in websocket.iter_json():
-            asyncio.create_task(handle_message(data))
+            await handle_message(data)
 
     except WebSocketDisconnect:
         print(f"LLM WebSocket disconnected for {call_id}")
@@ -124,4 +206,9 @@ async def websocket_handler(websocket: WebSocket, call_id: str):
         print(f"Error in LLM WebSocket: {e} for {call_id}")
         await websocket.close(1011, "Server error")
     finally:
+        if response_task is not None:
+            response_task.cancel()
+        if llm_client is not None:
+            llm_client.prefetcher.cancel()
+            llm_client.conversation.close()
         print(f"LLM WebSocket connection closed for {call_id}")
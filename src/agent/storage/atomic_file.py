@@ -0,0 +1,99 @@
+import os
+import time
+import tempfile
+import threading
+
+
+def fsync_directory(path: str):
+    """Make a rename inside path durable. Not supported (or needed) on Windows."""
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: str, content: str):
+    """Replace path with content so that a crash leaves either the old or the new file, never a torn one.
+
+    The data goes to a temp file in the same directory, is fsynced, and is then
+    renamed over path.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    fsync_directory(directory)
+
+
+class GroupCommit:
+    """Coalesce concurrent commit() calls into one flush.
+
+    The first caller becomes the leader, waits `window` seconds so that
+    commits landing in the meantime can join, then runs flush() once for all
+    of them. commit() only returns after a flush that started after the call
+    has finished, so an acknowledged write is always on disk.
+    """
+
+    def __init__(self, flush, window: float = 0.02):
+        self._flush = flush
+        self.window = window
+        self._cond = threading.Condition()
+        self._requested = 0
+        self._durable = 0
+        self._failed = (0, None)
+        self._flushing = False
+        self.flushes = 0
+
+    def pending(self) -> bool:
+        """True while some commit has not reached disk yet."""
+        with self._cond:
+            return self._requested > self._durable
+
+    def commit(self):
+        with self._cond:
+            self._requested += 1
+            ticket = self._requested
+            while True:
+                if self._durable >= ticket:
+                    return
+                if self._failed[0] >= ticket:
+                    raise self._failed[1]
+                if not self._flushing:
+                    break
+                self._cond.wait()
+            self._flushing = True
+
+        target = ticket
+        error = None
+        try:
+            if self.window > 0:
+                time.sleep(self.window)  # let concurrent commits join this flush
+            with self._cond:
+                target = self._requested
+            self._flush()
+        except BaseException as e:
+            error = e
+
+        with self._cond:
+            self._flushing = False
+            if error is None:
+                self._durable = target
+                self.flushes += 1
+            else:
+                self._failed = (target, error)
+            self._cond.notify_all()
+        if error is not None:
+            raise error
@@ -0,0 +1,162 @@
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+
+
+def _money(amount: float) -> float:
+    return round(amount, 2) + 0.0  # + 0.0 turns -0.0 into 0.0
+
+
+@dataclass
+class Position:
+    """One user's open FIFO lots in one symbol and the running totals over them."""
+
+    lots: deque = field(default_factory=deque)  # [shares, price_per_share, date], oldest first
+    open_shares: float = 0
+    open_cost: float = 0.0
+    realized_pnl: float = 0.0
+    # Shares sold with no lot to match, i.e. bought before the log began
+    unmatched_shares: float = 0
+
+
+class LotLedger:
+    """FIFO cost basis and P&L per user and symbol, derived from the transaction log.
+
+    A buy appends a lot; a sell consumes the oldest lots first and books
+    (sell price - lot price) per share as realized P&L. Every lot is added
+    and removed once, so applying a trade is O(1) amortized, and open shares
+    and cost are running totals, so reading a position never walks the
+    history.
+
+    The ledger follows source (a TransactionJournal or SQLiteStore) through
+    its replay() cursor: sync() applies only what was logged since the last
+    call, whoever logged it, and starting over is one streaming pass.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self._lock = threading.Lock()
+        self._version = None
+        self._cursor = None
+        self._positions = {}  # userid -> {SYMBOL: Position}
+        self.transactions = 0
+
+    def _apply(self, tx: dict):
+        try:
+            symbol = str(tx["stock_symbol"]).upper()
+            shares, price = tx["shares"], float(tx["price_per_share"])
+            if shares <= 0:
+                return
+        except (KeyError, TypeError, ValueError):
+            logging.error(f"Skipping malformed transaction {tx.get('id')} in the cost basis")
+            return
+        positions = self._positions.setdefault(tx.get("userid"), {})
+        position = positions.get(symbol)
+        if position is None:
+            position = positions[symbol] = Position()
+        self.transactions += 1
+
+        if tx.get("type") == "buy":
+            position.lots.append([shares, price, tx.get("date")])
+            position.open_shares += shares
+            position.open_cost += shares * price
+        elif tx.get("type") == "sell":
+            remaining = shares
+            while remaining > 0 and position.lots:
+                lot = position.lots[0]
+                matched = min(remaining, lot[0])
+                position.realized_pnl += matched * (price - lot[1])
+                position.open_shares -= matched
+                position.open_cost -= matched * lot[1]
+                lot[0] -= matched
+                remaining -= matched
+                if lot[0] <= 0:
+                    position.lots.popleft()
+            if not position.lots:
+                position.open_cost = 0.0  # drop float residue once nothing is open
+            position.unmatched_shares += remaining
+
+    def _sync(self):
+        version = self.source.version()
+        if version == self._version:
+            return
+        cursor = self.source.replay(self._apply, self._cursor)
+        if cursor is None:
+            self._positions, self.transactions = {}, 0
+            cursor = self.source.replay(self._apply, None)
+        self._cursor, self._version = cursor, version
+
+    def sync(self):
+        """Apply the transactions logged since the last sync."""
+        with self._lock:
+            self._sync()
+
+    def rebuild(self):
+        """Forget everything and replay the whole log in one pass."""
+        with self._lock:
+            self._positions, self.transactions = {}, 0
+            self._cursor = self._version = None
+            self._sync()
+
+    def open_symbols(self, userid: str) -> list:
+        """Symbols in which userid has open lots."""
+        with self._lock:
+            self._sync()
+            return [symbol for symbol, position in self._positions.get(userid, {}).items() if position.lots]
+
+    def report(self, userid: str, prices: dict, holdings: dict = None, symbol: str = None) -> dict:
+        """Cost basis, realized and unrealized P&L for userid at prices ({symbol: price}).
+
+        holdings is the user's portfolio; shares held beyond what the log
+        accounts for are reported as untracked_shares. symbol limits the
+        report to one position. Positions without a price get no unrealized
+        P&L and are listed in unpriced.
+        """
+        symbol = symbol.upper() if symbol else None
+        with self._lock:
+            self._sync()
+            positions = {
+                key: (position.open_shares, position.open_cost, position.realized_pnl, position.unmatched_shares, len(position.lots))
+                for key, position in self._positions.get(userid, {}).items()
+                if symbol is None or key == symbol
+            }
+        held = {key.upper(): shares for key, shares in (holdings or {}).items() if symbol is None or key.upper() == symbol}
+        for key in held:
+            positions.setdefault(key, (0, 0.0, 0.0, 0, 0))
+
+        report = {}
+        unpriced = []
+        realized_total = unrealized_total = cost_total = 0.0
+        for key, (open_shares, open_cost, realized_pnl, unmatched_shares, open_lots) in sorted(positions.items()):
+            entry = {
+                "open_shares": open_shares,
+                "open_lots": open_lots,
+                "cost_basis": _money(open_cost),
+                "average_cost": round(open_cost / open_shares, 4) if open_shares else None,
+                "realized_pnl": _money(realized_pnl),
+            }
+            price = prices.get(key)
+            if open_shares and price:
+                entry["price"] = price
+                entry["market_value"] = _money(open_shares * price)
+                entry["unrealized_pnl"] = _money(open_shares * price - open_cost)
+                unrealized_total += open_shares * price - open_cost
+            elif open_shares:
+                unpriced.append(key)
+            if unmatched_shares:
+                entry["unmatched_shares"] = unmatched_shares
+            if held.get(key, 0) > open_shares:
+                entry["untracked_shares"] = held[key] - open_shares
+            realized_total += realized_pnl
+            cost_total += open_cost
+            report[key] = entry
+
+        return {
+            "userid": userid,
+            "positions": report,
+            "cost_basis": _money(cost_total),
+            "realized_pnl": _money(realized_total),
+            "unrealized_pnl": _money(unrealized_total),
+            "unpriced": unpriced,
+        }
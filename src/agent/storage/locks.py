@@ -0,0 +1,37 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class KeyedLock:
+    """One asyncio.Lock per key, created on demand and dropped once nobody holds or waits on it.
+
+    Work under the same key (e.g. one userid) is serialized while different
+    keys run fully in parallel.
+    """
+
+    def __init__(self):
+        self._locks = {}  # key -> [asyncio.Lock, number of holders + waiters]
+
+    @asynccontextmanager
+    async def __call__(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def __len__(self):
+        return len(self._locks)
+
+
+# Shared by every DBHandler / UserDataManager in the process (one per websocket call)
+user_locks = KeyedLock()
+# Serializes the read-append-rewrite of user_transaction.json in "json" mode, which
+# every user's trades share, so concurrent trades can't drop each other's entries
+transaction_file_lock = asyncio.Lock()
@@ -0,0 +1,41 @@
+import os
+
+# Both the voice agent and the Flask backend work on the same data directory.
+# Set TREVOR_DATA_DIR to point them somewhere other than trevorai-backend/data.
+DATA_DIR = os.getenv(
+    "TREVOR_DATA_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "trevorai-backend", "data")),
+)
+
+USER_DATA_PATH = os.path.join(DATA_DIR, "user_data.json")
+TRANSACTION_PATH = os.path.join(DATA_DIR, "user_transaction.json")
+TRANSACTION_JOURNAL_PATH = os.path.join(DATA_DIR, "user_transaction.jsonl")
+
+# "journal" appends each trade as one line to user_transaction.jsonl (the legacy
+# user_transaction.json is kept as read-only history). "json" rewrites
+# user_transaction.json on every trade like before.
+TRANSACTION_STORE = os.getenv("TREVOR_TRANSACTION_STORE", "journal")
+
+# "json" keeps users and trades in the files above; "sqlite" uses SQLITE_PATH
+# (populate it once with `python -m storage.sqlite_store` from src/agent).
+STORAGE_ENGINE = os.getenv("TREVOR_STORAGE_ENGINE", "json")
+SQLITE_PATH = os.path.join(DATA_DIR, "trevor.db")
+
+# Seconds a write waits for other writes to join the same flush to disk
+COMMIT_WINDOW = float(os.getenv("TREVOR_COMMIT_WINDOW", "0.02"))
+
+# Local {symbol: price} fixture quotes, used only when TREVOR_QUOTE_PROVIDERS includes "file"
+QUOTES_PATH = os.path.join(DATA_DIR, "quotes.json")
+
+# The quotes the voice agent's refresher last fetched ({symbol: {price, timestamp, source}}),
+# which the Flask backend values portfolios at
+LIVE_QUOTES_PATH = os.path.join(DATA_DIR, "live_quotes.json")
+
+# One JSON file per company for research results kept across restarts
+RESEARCH_CACHE_DIR = os.path.join(DATA_DIR, "research_cache")
+
+# Daily bars per symbol for the backend's charts, loaded with trevorai-backend/price_history.py
+HISTORY_DIR = os.path.join(DATA_DIR, "history")
+
+# Listed companies ({symbol, name, aliases}) for resolving spoken names to symbols
+LISTINGS_PATH = os.path.join(DATA_DIR, "listings.json")
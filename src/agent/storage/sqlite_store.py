@@ -0,0 +1,295 @@
+import os
+import json
+import logging
+import sqlite3
+import threading
+
+from storage.paths import SQLITE_PATH, TRANSACTION_JOURNAL_PATH, TRANSACTION_PATH, USER_DATA_PATH
+from storage.trades import apply_legs, make_leg, transaction_for_leg
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    userid TEXT PRIMARY KEY,
+    user_name TEXT,
+    bank_bal REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS holdings (
+    userid TEXT NOT NULL REFERENCES users(userid),
+    stock_symbol TEXT NOT NULL,
+    shares INTEGER NOT NULL,
+    PRIMARY KEY (userid, stock_symbol)
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    userid TEXT NOT NULL,
+    stock_symbol TEXT NOT NULL,
+    stock_name TEXT,
+    type TEXT NOT NULL,
+    shares INTEGER NOT NULL,
+    price_per_share REAL NOT NULL,
+    date TEXT NOT NULL,
+    initiator TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_userid_date ON transactions (userid, date);
+CREATE INDEX IF NOT EXISTS idx_transactions_userid_id ON transactions (userid, id);
+"""
+
+TRANSACTION_COLUMNS = ("userid", "stock_symbol", "stock_name", "type", "shares", "price_per_share", "date", "initiator")
+
+
+class SQLiteStore:
+    """Users, holdings and transactions in one SQLite database in WAL mode.
+
+    Exposes the same get/all/append/iter_transactions methods as UserStore and
+    TransactionJournal, plus trade(), which checks and applies a buy or sell
+    and records it in a single database transaction. WAL lets the Flask
+    readers and the agent's writers work on the file at the same time.
+    """
+
+    def __init__(self, db_path: str = SQLITE_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _user_from_row(self, conn, row) -> dict:
+        holdings = conn.execute(
+            "SELECT stock_symbol, shares FROM holdings WHERE userid = ? ORDER BY rowid", (row["userid"],)
+        )
+        return {
+            "userid": row["userid"],
+            "user_name": row["user_name"],
+            "bank_bal": row["bank_bal"],
+            "portfolio": {h["stock_symbol"]: h["shares"] for h in holdings},
+        }
+
+    def version(self):
+        """Opaque value that changes whenever any connection writes (the WAL grows or is checkpointed)."""
+        signature = []
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def get(self, userid: str):
+        """Return the user record in the same shape as user_data.json, or None."""
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM users WHERE userid = ?", (userid,)).fetchone()
+        return self._user_from_row(conn, row) if row is not None else None
+
+    def all(self) -> list:
+        conn = self._connect()
+        portfolios = {}
+        for h in conn.execute("SELECT userid, stock_symbol, shares FROM holdings ORDER BY rowid"):
+            portfolios.setdefault(h["userid"], {})[h["stock_symbol"]] = h["shares"]
+        return [
+            {
+                "userid": row["userid"],
+                "user_name": row["user_name"],
+                "bank_bal": row["bank_bal"],
+                "portfolio": portfolios.get(row["userid"], {}),
+            }
+            for row in conn.execute("SELECT * FROM users ORDER BY rowid")
+        ]
+
+    def put(self, user: dict):
+        """Insert or replace a user record and its holdings."""
+        self.put_many([user])
+
+    def put_many(self, users: list):
+        """Insert or replace several user records in one transaction."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for user in users:
+                self._put_user(conn, user)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _put_user(self, conn, user: dict):
+        conn.execute(
+            "INSERT INTO users (userid, user_name, bank_bal) VALUES (?, ?, ?) "
+            "ON CONFLICT(userid) DO UPDATE SET user_name = excluded.user_name, bank_bal = excluded.bank_bal",
+            (user["userid"], user.get("user_name"), user.get("bank_bal", 0)),
+        )
+        conn.execute("DELETE FROM holdings WHERE userid = ?", (user["userid"],))
+        conn.executemany(
+            "INSERT INTO holdings (userid, stock_symbol, shares) VALUES (?, ?, ?)",
+            [(user["userid"], symbol, shares) for symbol, shares in user.get("portfolio", {}).items()],
+        )
+
+    def _insert_transaction(self, conn, transaction: dict) -> dict:
+        values = [transaction.get(column) for column in TRANSACTION_COLUMNS]
+        if transaction.get("id") is not None:
+            conn.execute(
+                f"INSERT OR IGNORE INTO transactions (id, {', '.join(TRANSACTION_COLUMNS)}) VALUES (?{', ?' * len(TRANSACTION_COLUMNS)})",
+                [int(transaction["id"])] + values,
+            )
+            return transaction
+        cursor = conn.execute(
+            f"INSERT INTO transactions ({', '.join(TRANSACTION_COLUMNS)}) VALUES ({', '.join('?' * len(TRANSACTION_COLUMNS))})",
+            values,
+        )
+        return {"id": str(cursor.lastrowid), **transaction}
+
+    def append(self, transaction: dict) -> dict:
+        """Record a transaction and return it with its assigned id."""
+        return self.append_many([transaction])[0]
+
+    def append_many(self, transactions: list) -> list:
+        """Record several transactions in one database transaction."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            entries = [
+                self._insert_transaction(conn, {k: v for k, v in tx.items() if k != "id"}) for tx in transactions
+            ]
+            conn.execute("COMMIT")
+            return entries
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def iter_transactions(self, userid: str = None):
+        """Yield transactions in id order, optionally only those for userid."""
+        conn = self._connect()
+        if userid is None:
+            rows = conn.execute("SELECT * FROM transactions ORDER BY id")
+        else:
+            rows = conn.execute("SELECT * FROM transactions WHERE userid = ? ORDER BY id", (userid,))
+        for row in rows:
+            yield {"id": str(row["id"]), **{column: row[column] for column in TRANSACTION_COLUMNS}}
+
+    def replay(self, apply, cursor=None):
+        """Call apply(tx) for every transaction after cursor and return the next cursor (see TransactionJournal.replay)."""
+        conn = self._connect()
+        last_id = cursor or 0
+        if last_id and (conn.execute("SELECT MAX(id) FROM transactions").fetchone()[0] or 0) < last_id:
+            return None
+        for row in conn.execute("SELECT * FROM transactions WHERE id > ? ORDER BY id", (last_id,)):
+            apply({"id": str(row["id"]), **{column: row[column] for column in TRANSACTION_COLUMNS}})
+            last_id = row["id"]
+        return last_id
+
+    def page(self, userid: str, limit: int = 50, cursor: str = None, since: str = None, until: str = None,
+             symbol: str = None):
+        """One page of userid's transactions, newest first, and the cursor for the next page (see TransactionJournal.page)."""
+        query = "SELECT * FROM transactions WHERE userid = ?"
+        params = [userid]
+        if cursor is not None:
+            query += " AND id < ?"
+            params.append(int(cursor))
+        if since:
+            query += " AND date >= ?"
+            params.append(since)
+        if until:
+            query += " AND date <= ?"
+            params.append(until)
+        if symbol:
+            query += " AND UPPER(stock_symbol) = ?"
+            params.append(symbol.upper())
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit + 1)
+        rows = self._connect().execute(query, params).fetchall()
+        page = [{"id": str(row["id"]), **{column: row[column] for column in TRANSACTION_COLUMNS}} for row in rows[:limit]]
+        return page, (page[-1]["id"] if len(rows) > limit else None)
+
+    def trade(self, userid: str, stock_symbol: str, transaction_type: str, shares: int, price_per_share: float, initiator: str = "agent"):
+        """Apply a buy or sell at price_per_share and log it, all in one transaction.
+
+        Returns an error message (nothing is written), or None on success.
+        """
+        failure = self.trade_many(userid, [make_leg(stock_symbol, transaction_type, shares, price_per_share)], initiator)
+        return failure["error"] if failure else None
+
+    def trade_many(self, userid: str, legs: list, initiator: str = "agent"):
+        """Validate and apply a basket of priced legs and log them, all in one transaction.
+
+        Returns None on success, or the apply_legs failure (nothing is written).
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT * FROM users WHERE userid = ?", (userid,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return {"error": "User not found.", "stock_symbol": None}
+            user = self._user_from_row(conn, row)
+            failure = apply_legs(user, legs)
+            if failure:
+                conn.execute("ROLLBACK")
+                return failure
+            self._put_user(conn, user)
+            for leg in legs:
+                self._insert_transaction(conn, transaction_for_leg(userid, leg, initiator))
+            conn.execute("COMMIT")
+            return None
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def import_json(self, user_path: str = USER_DATA_PATH, transaction_path: str = TRANSACTION_PATH,
+                    journal_path: str = TRANSACTION_JOURNAL_PATH):
+        """One-shot import of the JSON users file and transaction history (legacy file and journal).
+
+        Users are upserted and transactions keep their ids, so re-running it is safe.
+        """
+        from storage.transaction_journal import TransactionJournal
+
+        with open(user_path, "r") as f:
+            users = json.load(f)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for user in users:
+                self._put_user(conn, user)
+            count = 0
+            for tx in TransactionJournal(journal_path, transaction_path).iter_transactions():
+                self._insert_transaction(conn, tx)
+                count += 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logging.info(f"Imported {len(users)} users and {count} transactions into {self.db_path}")
+        return {"users": len(users), "transactions": count}
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_sqlite_store(db_path: str = SQLITE_PATH) -> SQLiteStore:
+    """Return the process-wide SQLiteStore for db_path, creating it on first use."""
+    key = os.path.abspath(db_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SQLiteStore(key)
+        return store
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    result = get_sqlite_store().import_json()
+    print(result)
+
+if __name__ == "__main__":
+    main()
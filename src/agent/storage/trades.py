@@ -0,0 +1,56 @@
+from datetime import datetime
+from typing import List, Optional
+
+
+def make_leg(stock_symbol: str, transaction_type: str, shares: int, price_per_share: float) -> dict:
+    return {
+        "stock_symbol": stock_symbol,
+        "type": transaction_type,  # "buy" or "sell"
+        "shares": shares,
+        "price_per_share": price_per_share,
+    }
+
+
+def apply_legs(user: dict, legs: List[dict]) -> Optional[dict]:
+    """Apply priced legs to user's bank_bal and portfolio in place.
+
+    Sells are applied before buys so that a rebalance can fund its purchases
+    with its own proceeds. Returns None on success, or {"error", "stock_symbol"}
+    for the first leg that can't be filled, in which case user is left
+    half-updated and must be discarded.
+    """
+    portfolio = user.setdefault("portfolio", {})
+    for leg in sorted(legs, key=lambda leg: leg["type"] != "sell"):
+        symbol = leg["stock_symbol"]
+        amount = leg["price_per_share"] * leg["shares"]
+        if leg["shares"] <= 0:
+            return {"error": "Quantity must be positive.", "stock_symbol": symbol}
+        if leg["type"] == "buy":
+            if user.get("bank_bal", 0) < amount:
+                return {"error": "Insufficient balance.", "stock_symbol": symbol}
+            user["bank_bal"] -= amount
+            portfolio[symbol] = portfolio.get(symbol, 0) + leg["shares"]
+        elif leg["type"] == "sell":
+            if portfolio.get(symbol, 0) < leg["shares"]:
+                return {"error": "Not enough stock to sell.", "stock_symbol": symbol}
+            portfolio[symbol] -= leg["shares"]
+            if portfolio[symbol] == 0:
+                del portfolio[symbol]
+            user["bank_bal"] += amount
+        else:
+            return {"error": f"Unknown trade type '{leg['type']}'.", "stock_symbol": symbol}
+    return None
+
+
+def transaction_for_leg(userid: str, leg: dict, initiator: str = "agent") -> dict:
+    """Transaction log entry (without id) for an executed leg."""
+    return {
+        "userid": userid,
+        "stock_symbol": leg["stock_symbol"],
+        "stock_name": leg["stock_symbol"],  # Placeholder, since no name lookup is implemented
+        "type": leg["type"],
+        "shares": leg["shares"],
+        "price_per_share": leg["price_per_share"],
+        "date": datetime.utcnow().strftime("%Y-%m-%d"),
+        "initiator": initiator,
+    }
@@ -0,0 +1,321 @@
+import os
+import json
+import bisect
+import logging
+import threading
+
+from storage.atomic_file import GroupCommit
+from storage.paths import COMMIT_WINDOW, TRANSACTION_JOURNAL_PATH, TRANSACTION_PATH
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock is used
+    fcntl = None
+
+
+class TransactionJournal:
+    """Append-only, line-delimited transaction log.
+
+    Every trade is one JSON line appended with a single write, so logging a
+    trade costs the same no matter how long the history is. Ids come from a
+    monotonic sequence that continues after the legacy user_transaction.json,
+    which is still read as the start of the history but never rewritten.
+    append() returns once the line is fsynced; appends within commit_window
+    seconds of each other share one fsync.
+
+    A per-user index of journal byte offsets (kept up to date as trades are
+    appended, here or by another process) lets page() return one page of a
+    user's history without reading anyone else's.
+    """
+
+    def __init__(self, journal_path: str = TRANSACTION_JOURNAL_PATH, legacy_path: str = TRANSACTION_PATH,
+                 commit_window: float = COMMIT_WINDOW):
+        self.journal_path = journal_path
+        self.legacy_path = legacy_path
+        self._lock = threading.Lock()
+        self._last_id = None
+        self._journal_size = None
+        self._commit = GroupCommit(self._fsync, commit_window)
+        self._index_lock = threading.Lock()
+        self._legacy_signature = False  # never matches, so the first lookup builds the index
+        self._indexed_size = 0
+        self._by_user = {}         # userid -> [(id, ref)] in id order
+        self._by_user_symbol = {}  # (userid, SYMBOL) -> [(id, ref)] in id order
+
+    def _fsync(self):
+        fd = os.open(self.journal_path, os.O_RDWR | os.O_APPEND | getattr(os, "O_BINARY", 0))
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _legacy_transactions(self) -> list:
+        try:
+            with open(self.legacy_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _read_last_journal_id(self, fd: int):
+        """Return the id of the last complete line in the journal, or None if it is empty."""
+        size = os.fstat(fd).st_size
+        block = 4096
+        tail = b""
+        offset = size
+        while offset > 0:
+            read_size = min(block, offset)
+            offset -= read_size
+            os.lseek(fd, offset, os.SEEK_SET)
+            tail = os.read(fd, read_size) + tail
+            lines = tail.rstrip(b"\n").split(b"\n")
+            if len(lines) > 1 or offset == 0:
+                last = lines[-1].strip()
+                return int(json.loads(last)["id"]) if last else None
+        return None
+
+    def _drop_torn_tail(self, fd: int):
+        """Cut off a partial last line left by a write that never finished.
+
+        Only called with the file lock held, when no append can be in progress,
+        so a missing final newline means the line is torn and never will be
+        complete.
+        """
+        size = os.fstat(fd).st_size
+        if size == 0:
+            return
+        os.lseek(fd, size - 1, os.SEEK_SET)
+        if os.read(fd, 1) == b"\n":
+            return
+        end = size
+        block = 4096
+        while end > 0:
+            start = max(0, end - block)
+            os.lseek(fd, start, os.SEEK_SET)
+            chunk = os.read(fd, end - start)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        logging.error(f"Dropping {size - end} bytes of a torn line at the end of {self.journal_path}")
+        os.ftruncate(fd, end)
+
+    def _sync_sequence(self, fd: int):
+        """Reseed the id sequence if the journal was appended to by someone else."""
+        size = os.fstat(fd).st_size
+        if self._last_id is not None and size == self._journal_size:
+            return
+        last_id = self._read_last_journal_id(fd) if size else None
+        if last_id is None:
+            last_id = max((int(tx["id"]) for tx in self._legacy_transactions()), default=0)
+        self._last_id = last_id
+
+    def append(self, transaction: dict) -> dict:
+        """Assign the next id to transaction, append it to the journal and return it."""
+        return self.append_many([transaction])[0]
+
+    def append_many(self, transactions: list) -> list:
+        """Append several transactions with consecutive ids in a single write."""
+        with self._lock:
+            fd = os.open(self.journal_path, os.O_RDWR | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                self._drop_torn_tail(fd)
+                self._sync_sequence(fd)
+                entries = [
+                    {"id": str(self._last_id + n), **{k: v for k, v in tx.items() if k != "id"}}
+                    for n, tx in enumerate(transactions, start=1)
+                ]
+                lines = [(json.dumps(entry) + "\n").encode("utf-8") for entry in entries]
+                offset = os.fstat(fd).st_size
+                os.write(fd, b"".join(lines))
+                self._last_id += len(entries)
+                self._journal_size = os.fstat(fd).st_size
+                self._index_appended(offset, entries, lines)
+            finally:
+                os.close(fd)
+        self._commit.commit()
+        return entries
+
+    def version(self):
+        """Opaque value that changes whenever the legacy file or the journal does."""
+        signature = []
+        for path in (self.legacy_path, self.journal_path):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _index_entry(self, tx: dict, ref):
+        """ref is the transaction itself (legacy file) or its byte offset in the journal."""
+        entry = (int(tx["id"]), ref)
+        self._by_user.setdefault(tx.get("userid"), []).append(entry)
+        self._by_user_symbol.setdefault((tx.get("userid"), str(tx.get("stock_symbol")).upper()), []).append(entry)
+
+    def _index_appended(self, offset: int, entries: list, lines: list):
+        """Index entries we just wrote at offset, if the index was caught up to that point."""
+        with self._index_lock:
+            if self._legacy_signature is False or self._indexed_size != offset:
+                return  # the next lookup catches up from disk instead
+            for entry, line in zip(entries, lines):
+                self._index_entry(entry, offset)
+                offset += len(line)
+            self._indexed_size = offset
+
+    def _refresh_index(self):
+        """Bring the index up to date, reading only journal bytes appended since the last call."""
+        try:
+            stat = os.stat(self.legacy_path)
+            legacy_signature = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            legacy_signature = None
+        try:
+            size = os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            size = 0
+
+        if legacy_signature != self._legacy_signature or size < self._indexed_size:
+            self._by_user, self._by_user_symbol = {}, {}
+            self._indexed_size = 0
+            for tx in sorted(self._legacy_transactions(), key=lambda tx: int(tx["id"])):
+                self._index_entry(tx, tx)
+            self._legacy_signature = legacy_signature
+
+        if size > self._indexed_size:
+            with open(self.journal_path, "rb") as f:
+                f.seek(self._indexed_size)
+                offset = self._indexed_size
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # a write still in progress
+                    try:
+                        self._index_entry(json.loads(line), offset)
+                    except (json.JSONDecodeError, KeyError, ValueError):
+                        logging.error(f"Skipping corrupt journal line in {self.journal_path}")
+                    offset += len(line)
+                self._indexed_size = offset
+
+    def page(self, userid: str, limit: int = 50, cursor: str = None, since: str = None, until: str = None,
+             symbol: str = None):
+        """One page of userid's transactions, newest first, and the cursor for the next page.
+
+        cursor is the next_cursor of the previous page (None for the first);
+        since/until are inclusive YYYY-MM-DD dates. next_cursor is None once
+        there is nothing older to return.
+        """
+        with self._index_lock:
+            self._refresh_index()
+            if symbol:
+                entries = self._by_user_symbol.get((userid, symbol.upper()), [])
+            else:
+                entries = self._by_user.get(userid, [])
+            # Lists are only ever appended to (or replaced on rebuild), so
+            # entries[:end] stays valid after the lock is released
+            end = len(entries) if cursor is None else bisect.bisect_left(entries, (int(cursor),))
+
+        page = []
+        f = None
+        try:
+            for i in range(end - 1, -1, -1):
+                ref = entries[i][1]
+                if isinstance(ref, dict):
+                    tx = ref
+                else:
+                    if f is None:
+                        f = open(self.journal_path, "rb")
+                    f.seek(ref)
+                    tx = json.loads(f.readline())
+                if since and tx.get("date", "") < since:
+                    continue  # ids don't follow dates in the legacy file, so keep looking
+                if until and tx.get("date", "") > until:
+                    continue
+                page.append(tx)
+                if len(page) == limit:
+                    return page, (tx["id"] if i > 0 else None)
+        finally:
+            if f is not None:
+                f.close()
+        return page, None
+
+    def iter_transactions(self, userid: str = None):
+        """Yield every transaction in id order, optionally only those for userid."""
+        for tx in self._legacy_transactions():
+            if userid is None or tx.get("userid") == userid:
+                yield tx
+        try:
+            f = open(self.journal_path, "r")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # a write still in progress
+                try:
+                    tx = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.error(f"Skipping corrupt journal line in {self.journal_path}")
+                    continue
+                if userid is None or tx.get("userid") == userid:
+                    yield tx
+
+    def replay(self, apply, cursor=None):
+        """Call apply(tx) for every transaction after cursor, in id order, and return the next cursor.
+
+        cursor is what the previous call returned, or None to start from the
+        beginning, so a caller that keeps it only ever reads what was appended
+        since. Returns None without applying anything if the history was
+        rewritten under the cursor and the caller has to start over.
+        """
+        legacy_signature, legacy_count, offset = cursor or (None, 0, 0)
+        try:
+            stat = os.stat(self.legacy_path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signature = None
+        try:
+            size = os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            size = 0
+        if size < offset:
+            return None
+
+        if signature != legacy_signature:
+            # The legacy file only changes in "json" mode, where trades are appended to its list
+            legacy = sorted(self._legacy_transactions(), key=lambda tx: int(tx["id"]))
+            if len(legacy) < legacy_count:
+                return None
+            for tx in legacy[legacy_count:]:
+                apply(tx)
+            legacy_count = len(legacy)
+
+        if size > offset:
+            with open(self.journal_path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # a write still in progress
+                    offset += len(line)
+                    try:
+                        tx = json.loads(line)
+                    except json.JSONDecodeError:
+                        logging.error(f"Skipping corrupt journal line in {self.journal_path}")
+                        continue
+                    apply(tx)
+        return signature, legacy_count, offset
+
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_transaction_journal(journal_path: str = TRANSACTION_JOURNAL_PATH, legacy_path: str = TRANSACTION_PATH) -> TransactionJournal:
+    """Return the process-wide TransactionJournal for journal_path, creating it on first use."""
+    key = os.path.abspath(journal_path)
+    with _journals_lock:
+        journal = _journals.get(key)
+        if journal is None:
+            journal = _journals[key] = TransactionJournal(key, os.path.abspath(legacy_path))
+        return journal
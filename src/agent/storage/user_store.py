@@ -0,0 +1,102 @@
+import os
+import copy
+import json
+import logging
+import threading
+
+from storage.atomic_file import GroupCommit, atomic_write
+from storage.paths import COMMIT_WINDOW, USER_DATA_PATH
+
+
+class UserStore:
+    """In-memory view of user_data.json indexed by userid.
+
+    The file is parsed once and kept in a dict, so lookups are O(1) no matter
+    how many users there are. Writes go through to disk, and the file is only
+    re-read when its mtime or size changes (e.g. another process wrote it).
+
+    Writes replace the file atomically, and puts that arrive within
+    commit_window seconds of each other share a single rewrite.
+    """
+
+    def __init__(self, file_path: str = USER_DATA_PATH, commit_window: float = COMMIT_WINDOW):
+        self.file_path = file_path
+        self._lock = threading.RLock()
+        self._users = {}
+        self._signature = None
+        self._writes = 0
+        self._commit = GroupCommit(self._persist, commit_window)
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self):
+        """Reload the index if the file on disk is not the one we loaded."""
+        signature = self._file_signature()
+        if signature == self._signature or self._commit.pending():
+            return  # unchanged, or our own unflushed writes are newer than the file
+        users = {}
+        if signature is not None:
+            with open(self.file_path, "r") as f:
+                for user in json.load(f):
+                    users[user["userid"]] = user
+        self._users = users
+        self._signature = signature
+        logging.info(f"Loaded {len(users)} users from {self.file_path}")
+
+    def _persist(self):
+        with self._lock:
+            content = json.dumps(list(self._users.values()), indent=2)
+        atomic_write(self.file_path, content)
+        with self._lock:
+            self._signature = self._file_signature()
+
+    def get(self, userid: str):
+        """Return a copy of the user record, or None if there is no such user."""
+        with self._lock:
+            self._refresh()
+            user = self._users.get(userid)
+            return copy.deepcopy(user) if user is not None else None
+
+    def all(self) -> list:
+        """Return every user record in file order. Treat the result as read-only."""
+        with self._lock:
+            self._refresh()
+            return list(self._users.values())
+
+    def put(self, user: dict):
+        """Insert or replace a user record. Returns once the change is on disk."""
+        self.put_many([user])
+
+    def put_many(self, users: list):
+        """Insert or replace several user records with a single commit."""
+        with self._lock:
+            self._refresh()
+            for user in users:
+                self._users[user["userid"]] = copy.deepcopy(user)
+            self._writes += 1
+        self._commit.commit()
+
+    def version(self):
+        """Opaque value that changes whenever the data does (here or in the file on disk)."""
+        with self._lock:
+            self._refresh()
+            return (self._signature, self._writes)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_user_store(file_path: str = USER_DATA_PATH) -> UserStore:
+    """Return the process-wide UserStore for file_path, creating it on first use."""
+    key = os.path.abspath(file_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = UserStore(key)
+        return store
@@ -0,0 +1,188 @@
+import threading
+
+import numpy as np
+
+
+class PortfolioMatrix:
+    """Every user's holdings packed into one users x symbols share matrix.
+
+    Rows follow user order, columns a symbol index that grows as new symbols
+    appear. value() prices all portfolios at once: one matrix-vector product
+    gives each user's market value, and the same price vector gives weights
+    and the exposure per symbol. A trade touches one row via update_user();
+    anything else that changes the store (another process, a bulk import)
+    shows up as a new store version and triggers a rebuild on next use.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._version = None
+        self.userids = []
+        self._rows = {}     # userid -> row
+        self.symbols = []
+        self._columns = {}  # symbol -> column
+        # Allocated with spare rows and columns so a new user or symbol is amortized O(1);
+        # only [:len(userids), :len(symbols)] is live
+        self._matrix = np.zeros((0, 0))
+        self._cash_vector = np.zeros(0)
+
+    @property
+    def _shares(self):
+        return self._matrix[:len(self.userids), :len(self.symbols)]
+
+    @property
+    def _cash(self):
+        return self._cash_vector[:len(self.userids)]
+
+    def _sync(self):
+        version = self.store.version()
+        if version != self._version:
+            self._build(self.store.all())
+            self._version = version
+
+    def _build(self, users: list):
+        symbols = sorted({symbol.upper() for user in users for symbol in user.get("portfolio", {})})
+        self.userids = [user["userid"] for user in users]
+        self._rows = {userid: row for row, userid in enumerate(self.userids)}
+        self.symbols = symbols
+        self._columns = {symbol: column for column, symbol in enumerate(symbols)}
+        self._matrix = np.zeros((len(users), len(symbols)))
+        self._cash_vector = np.array([float(user.get("bank_bal", 0)) for user in users])
+        rows, columns, shares = [], [], []
+        for row, user in enumerate(users):
+            for symbol, quantity in user.get("portfolio", {}).items():
+                rows.append(row)
+                columns.append(self._columns[symbol.upper()])
+                shares.append(quantity)
+        self._matrix[rows, columns] = shares
+
+    def _grow(self, rows: int, columns: int):
+        """Make room for at least rows x columns, doubling the allocation when it runs out."""
+        have_rows, have_columns = self._matrix.shape
+        if rows <= have_rows and columns <= have_columns:
+            return
+        if rows > have_rows:
+            rows = max(rows, have_rows * 2)
+        if columns > have_columns:
+            columns = max(columns, have_columns * 2)
+        matrix = np.zeros((max(rows, have_rows), max(columns, have_columns)))
+        matrix[:have_rows, :have_columns] = self._matrix
+        self._matrix = matrix
+        if len(self._cash_vector) < matrix.shape[0]:
+            self._cash_vector = np.concatenate([self._cash_vector, np.zeros(matrix.shape[0] - len(self._cash_vector))])
+
+    def _column(self, symbol: str) -> int:
+        column = self._columns.get(symbol)
+        if column is None:
+            self._grow(len(self.userids), len(self.symbols) + 1)
+            column = self._columns[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return column
+
+    def update_user(self, user: dict, version_before):
+        """Replace one user's row after a trade we just wrote, without a rebuild.
+
+        version_before is store.version() read just before that write. The
+        row is only patched in if the matrix was current at that point;
+        otherwise (or if it was never built) it is left stale and rebuilt by
+        the next read, never inside the trade.
+        """
+        with self._lock:
+            if self._version is None or version_before != self._version:
+                self._version = None
+                return
+            row = self._rows.get(user["userid"])
+            if row is None:
+                self._grow(len(self.userids) + 1, len(self.symbols))
+                row = self._rows[user["userid"]] = len(self.userids)
+                self.userids.append(user["userid"])
+            portfolio = user.get("portfolio", {})
+            columns = [self._column(symbol.upper()) for symbol in portfolio]
+            self._matrix[row, :] = 0
+            self._matrix[row, columns] = list(portfolio.values())
+            self._cash_vector[row] = float(user.get("bank_bal", 0))
+            # The matrix was current up to our write, and the write is now applied
+            self._version = self.store.version()
+
+    def held_symbols(self, userid: str = None) -> list:
+        """Symbols anyone holds, or only those in userid's row."""
+        with self._lock:
+            self._sync()
+            if userid is None:
+                return list(self.symbols)
+            row = self._rows.get(userid)
+            if row is None:
+                return []
+            return [self.symbols[column] for column in np.flatnonzero(self._shares[row])]
+
+    def value(self, prices: dict) -> dict:
+        """Value every portfolio at prices ({symbol: price}); unpriced symbols count as 0 and are listed.
+
+        Per user: market value, cash, total value and the largest position's
+        weight. Per symbol: total exposure across all users.
+        """
+        with self._lock:
+            self._sync()
+            symbols, userids = list(self.symbols), list(self.userids)
+            shares, cash = self._shares, self._cash.copy()
+            price_vector = np.array([prices.get(symbol) or 0.0 for symbol in symbols])
+            market_values = shares @ price_vector
+            exposure = shares.sum(axis=0) * price_vector
+            if symbols:
+                holding_values = shares * price_vector
+                top_columns = holding_values.argmax(axis=1)
+                top_values = holding_values[np.arange(len(userids)), top_columns]
+            else:
+                top_columns, top_values = np.zeros(len(userids), dtype=int), np.zeros(len(userids))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            top_weights = np.where(market_values > 0, top_values / market_values, 0.0)
+
+        users = {
+            userid: {
+                "userid": userid,
+                "market_value": round(market_value, 2),
+                "cash": round(user_cash, 2),
+                "total_value": round(market_value + user_cash, 2),
+                "largest_position": {"stock_symbol": symbols[column], "weight": round(weight, 4)} if weight > 0 else None,
+            }
+            for userid, market_value, user_cash, weight, column in zip(
+                userids, market_values.tolist(), cash.tolist(), top_weights.tolist(), top_columns.tolist()
+            )
+        }
+        return {
+            "users": users,
+            "exposure": dict(zip(symbols, np.round(exposure, 2).tolist())),
+            "total_market_value": round(float(market_values.sum()), 2),
+            "unpriced": [symbol for symbol in symbols if not prices.get(symbol)],
+        }
+
+    def value_user(self, userid: str, prices: dict):
+        """One user's valuation (see value()), or None if there is no such user."""
+        with self._lock:
+            self._sync()
+            row = self._rows.get(userid)
+            if row is None:
+                return None
+            symbols = list(self.symbols)
+            shares, cash = self._shares[row].copy(), float(self._cash[row])
+        price_vector = np.array([prices.get(symbol) or 0.0 for symbol in symbols])
+        holding_values = shares * price_vector
+        market_value = float(holding_values.sum())
+        held = np.flatnonzero(shares)
+        return {
+            "userid": userid,
+            "market_value": round(market_value, 2),
+            "cash": round(cash, 2),
+            "total_value": round(market_value + cash, 2),
+            "holdings": {
+                symbols[column]: {
+                    "shares": float(shares[column]),
+                    "price": prices.get(symbols[column]),
+                    "value": round(float(holding_values[column]), 2),
+                    "weight": round(float(holding_values[column]) / market_value, 4) if market_value > 0 else 0.0,
+                }
+                for column in held
+            },
+            "unpriced": [symbols[column] for column in held if not prices.get(symbols[column])],
+        }
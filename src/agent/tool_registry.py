@@ -0,0 +1,121 @@
+import os
+import json
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# Seconds a tool may run before its result is replaced by a timeout error
+DEFAULT_TOOL_TIMEOUT = float(os.getenv("TREVOR_TOOL_TIMEOUT", "30"))
+
+
+@dataclass
+class Tool:
+    """A function the model can call: its schema, the coroutine that runs it and what Trevor says meanwhile."""
+
+    name: str
+    description: str
+    parameters: dict
+    handler: Optional[Callable[..., Awaitable]] = None  # None for tools draft_response handles itself (end_call)
+    progress: str = "look into that"  # "Sure, let me {progress} for you..."
+    timeout: Optional[float] = DEFAULT_TOOL_TIMEOUT  # None: never cut off (trades)
+    interruptible: bool = True  # False: keep running even if the caller barges in (trades)
+    normalizers: Dict[str, Callable] = field(default_factory=dict)  # argument -> canonical form, applied before the handler
+    schema: dict = field(init=False)
+
+    def __post_init__(self):
+        self.schema = {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters,
+            },
+        }
+
+    def bind_arguments(self, arguments: dict) -> dict:
+        """Keyword arguments for the handler: declared parameters only, required ones checked, normalizers applied."""
+        missing = [name for name in self.parameters.get("required", []) if name not in arguments]
+        if missing:
+            raise ValueError(f"{self.name} is missing {', '.join(missing)}")
+        properties = self.parameters.get("properties", {})
+        return {
+            name: self.normalizers[name](value) if name in self.normalizers else value
+            for name, value in arguments.items()
+            if name in properties
+        }
+
+
+class ToolRegistry:
+    """Tools by name. The schema list sent to the model is built once, not per request."""
+
+    def __init__(self, tools: List[Tool] = ()):
+        self._tools: Dict[str, Tool] = {}
+        self._schemas = []
+        for tool in tools:
+            self.register(tool)
+
+    def register(self, tool: Tool):
+        self._tools[tool.name] = tool
+        self._schemas = [t.schema for t in self._tools.values()]
+
+    def get(self, name: str) -> Optional[Tool]:
+        return self._tools.get(name)
+
+    def schemas(self) -> list:
+        return self._schemas
+
+
+class ToolCallAssembler:
+    """Reassembles streamed tool-call fragments into complete calls.
+
+    Argument fragments are buffered per call (keyed by the stream's index) and
+    joined and parsed exactly once, when the call is complete: as soon as a
+    fragment for another call arrives, or when the stream ends. Completed calls
+    are {"id", "func_name", "arguments": dict}.
+    """
+
+    def __init__(self):
+        self._calls = {}  # index -> {"id", "func_name", "fragments"}
+        self._current = None
+        self._next_index = 0
+
+    def feed(self, tool_call_deltas) -> list:
+        """Add one chunk's tool-call deltas and return the calls they completed."""
+        completed = []
+        for delta in tool_call_deltas or []:
+            index = delta.index
+            if index is None:
+                # Gemini can omit the index; a named fragment starts a new call
+                index = self._next_index if delta.function.name or self._current is None else self._current
+            if self._current is not None and index != self._current:
+                completed.extend(self._complete(self._current))
+            self._current = index
+            self._next_index = max(self._next_index, index + 1)
+
+            call = self._calls.setdefault(index, {"id": None, "func_name": None, "fragments": []})
+            if delta.id:
+                call["id"] = delta.id
+            if delta.function.name:
+                call["func_name"] = delta.function.name
+            if delta.function.arguments:
+                call["fragments"].append(delta.function.arguments)
+        return completed
+
+    def finish(self) -> list:
+        """Complete whatever is still buffered at the end of the stream."""
+        completed = []
+        for index in sorted(self._calls):
+            completed.extend(self._complete(index))
+        self._current = None
+        return completed
+
+    def _complete(self, index) -> list:
+        call = self._calls.pop(index, None)
+        if call is None or not call["func_name"]:
+            return []
+        raw = "".join(call["fragments"])
+        try:
+            arguments = json.loads(raw) if raw else {}
+        except json.JSONDecodeError:
+            print(f"Could not parse arguments for {call['func_name']}: {raw}")
+            return []
+        return [{"id": call["id"] or f"call_{index}", "func_name": call["func_name"], "arguments": arguments}]
@@ -1,27 +1,30 @@
 import os
 import logging
 import asyncio
-from openai import AsyncOpenAI
-from dotenv import load_dotenv
+from clients import get_clients
+from tracing import LLM_SECONDS, span
+from tools.research_cache import research_cache, research_key
 
 class MarketResearch:
-    def __init__(self):
-        load_dotenv()
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables.")
-        self.client = AsyncOpenAI(api_key=self.api_key)
+    def __init__(self, clients=None):
+        # The shared OpenAI client from the process-wide ClientRegistry
+        self.client = (clients or get_clients()).openai
 
     async def deep_search(self, company_name: str, model: str = "gpt-4o") -> str:
+        """Research answer for company_name, from the shared research cache when it is recent enough"""
+        return await research_cache.get(research_key(company_name), lambda: self._research(company_name, model))
+
+    async def _research(self, company_name: str, model: str) -> str:
         try:
-            response = await self.client.responses.create(
-                model=model,
-                tools=[{"type": "web_search_preview"}],
-                input=[
-                    {"role": "system", "content": "You are a company news curator. Your job is to constantly monitor current events across politics, technology, business, science, and culture. Summarize important developments clearly, stay unbiased, highlight emerging trends, and maintain up-to-date knowledge about what's happening around the world"},
-                    {"role": "user", "content": f"Research what's happening around {company_name} stocks and tell me the current stock price"}
-                ]
-            )
+            with span("llm.research", LLM_SECONDS, call="research", model=model):
+                response = await self.client.responses.create(
+                    model=model,
+                    tools=[{"type": "web_search_preview"}],
+                    input=[
+                        {"role": "system", "content": "You are a company news curator. Your job is to constantly monitor current events across politics, technology, business, science, and culture. Summarize important developments clearly, stay unbiased, highlight emerging trends, and maintain up-to-date knowledge about what's happening around the world"},
+                        {"role": "user", "content": f"Research what's happening around {company_name} stocks and tell me the current stock price"}
+                    ]
+                )
             return response.output_text
         except Exception as e:
             logging.error(f"Error during OpenAI request: {e}")
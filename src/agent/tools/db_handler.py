@@ -1,97 +1,218 @@
 import aiofiles
+import asyncio
+import copy
 import json
-import re
 import logging
 import uuid
-from datetime import datetime
+
+from storage.atomic_file import atomic_write
+from storage.cost_basis import LotLedger
+from storage.locks import transaction_file_lock, user_locks
+from storage.paths import STORAGE_ENGINE, TRANSACTION_PATH, TRANSACTION_STORE
+from storage.sqlite_store import get_sqlite_store
+from storage.trades import apply_legs, make_leg, transaction_for_leg
+from storage.transaction_journal import get_transaction_journal
+from storage.user_store import get_user_store
+from storage.valuation import PortfolioMatrix
+from tools.quote_cache import price_cache
+from tools.quote_provider import build_quote_provider
+from tracing import STORAGE_SECONDS, span
 
 class DBHandler:
     def __init__(self, research_client):
         self.research_client = research_client
+        self.quotes = build_quote_provider(research_client)
+        # Upstream-only chain for the background refresher, which stamps what it fetches as fresh
+        self.live_quotes = build_quote_provider(research_client, live_only=True)
+        if STORAGE_ENGINE == "sqlite":
+            # Trades go through sqlite.trade(); users/journal serve the read paths
+            self.sqlite = get_sqlite_store()
+            self.users = self.sqlite
+            self.journal = self.sqlite
+        else:
+            self.sqlite = None
+            self.users = get_user_store()
+            self.journal = get_transaction_journal() if TRANSACTION_STORE == "journal" else None
+        self.valuation = PortfolioMatrix(self.users)
+        self.cost_basis = LotLedger(self.journal or get_transaction_journal())
+
+    async def _io(self, func, *args):
+        """Run a blocking store call in a thread, timed per operation for /metrics"""
+        with span(f"storage.{func.__qualname__}", STORAGE_SECONDS, operation=func.__qualname__):
+            return await asyncio.to_thread(func, *args)
 
     async def get_user_profile(self, userid: str) -> str:
         try:
-            async with aiofiles.open("C:\\Users\\Administrator\\Downloads\\TrevorAI\\trevorai-backend\\data\\user_data.json", "r") as f:
-                content = await f.read()
-                users = json.loads(content)
-
-            for user in users:
-                if user.get("userid") == userid:
-                    return json.dumps(user, indent=2)
+            user = await self._io(self.users.get, userid)
+            if user is not None:
+                return json.dumps(user, indent=2)
 
             return json.dumps({"error": "User not found"}, indent=2)
         except Exception as e:
             logging.error(f"Error loading user profile: {e}")
             return json.dumps({"error": "Failed to load user data"}, indent=2)
 
-    async def _log_transaction(self, userid: str, stock_symbol: str, transaction_type: str, shares: int, price_per_share: float):
-        """Internal helper to log the transaction into C:\\Users\\Administrator\\Downloads\\TrevorAI\\trevorai-backend\\data\\user_transaction.json"""
+    async def get_user_transactions(self, userid: str, limit: int = 10, cursor: str = None, since: str = None,
+                                    until: str = None, stock_symbol: str = None) -> str:
+        """One page of the user's trade history, newest first."""
         try:
-            # Load existing transactions
-            async with aiofiles.open("C:\\Users\\Administrator\\Downloads\\TrevorAI\\trevorai-backend\\data\\user_transaction.json", "r") as f:
-                content = await f.read()
-                transactions = json.loads(content)
-
-            # Create a new transaction entry
-            new_transaction = {
-                "id": str(len(transactions) + 1),
-                "userid": userid,
-                "stock_symbol": stock_symbol,
-                "stock_name": stock_symbol,  # Placeholder, since no name lookup is implemented
-                "type": transaction_type,    # "buy" or "sell"
-                "shares": shares,
-                "price_per_share": price_per_share,
-                "date": datetime.utcnow().strftime("%Y-%m-%d"),
-                "initiator": "agent"
-            }
-
-            transactions.append(new_transaction)
+            journal = self.journal or get_transaction_journal()
+            transactions, next_cursor = await self._io(
+                journal.page, userid, limit, cursor, since, until, stock_symbol
+            )
+            return json.dumps({"transactions": transactions, "next_cursor": next_cursor}, indent=2)
+        except Exception as e:
+            logging.error(f"Error loading transactions: {e}")
+            return json.dumps({"error": "Failed to load transactions"}, indent=2)
 
-            # Save back
-            async with aiofiles.open("C:\\Users\\Administrator\\Downloads\\TrevorAI\\trevorai-backend\\data\\user_transaction.json", "w") as f:
-                await f.write(json.dumps(transactions, indent=2))
+    async def get_quote(self, stock_symbol: str, allow_stale: bool = True):
+        """Current Quote for stock_symbol via the shared cache and the provider chain, or None.
+
+        allow_stale=False skips quotes past the cache TTL (see QuoteCache.get).
+        """
+        return await price_cache.get(stock_symbol, lambda: self.quotes.get_quote(stock_symbol), allow_stale)
+
+    async def get_stock_price(self, stock_symbol: str):
+        """Price to trade stock_symbol at, from a quote no older than the cache TTL, or None."""
+        quote = await self.get_quote(stock_symbol, allow_stale=False)
+        return quote.price if quote is not None else None
+
+    async def get_prices(self, symbols: list) -> dict:
+        """{SYMBOL: price} for the symbols that could be priced; cache misses are fetched in one provider batch."""
+        quotes = await price_cache.get_many(symbols, self.quotes.get_quotes)
+        return {symbol: quote.price for symbol, quote in quotes.items()}
 
+    async def get_portfolio_valuation(self, userid: str) -> str:
+        """Market value, cash and per-holding value and weight for one user's portfolio."""
+        try:
+            symbols = await self._io(self.valuation.held_symbols, userid)
+            prices = await self.get_prices(symbols)
+            valuation = await self._io(self.valuation.value_user, userid, prices)
+            if valuation is None:
+                return json.dumps({"error": "User not found"}, indent=2)
+            return json.dumps(valuation, indent=2)
         except Exception as e:
-            logging.error(f"Error logging transaction: {e}")
+            logging.error(f"Error valuing portfolio: {e}")
+            return json.dumps({"error": "Failed to value portfolio"}, indent=2)
 
-    async def buy_stock_for_user(self, userid: str, stock_symbol: str, quantity: int) -> str:
+    async def get_profit_and_loss(self, userid: str, stock_symbol: str = None) -> str:
+        """FIFO cost basis with realized and unrealized P&L for a user, optionally for one symbol."""
         try:
-            async with aiofiles.open("C:\\Users\\Administrator\\Downloads\\TrevorAI\\trevorai-backend\\data\\user_data.json", "r") as f:
-                content = await f.read()
-                users = json.loads(content)
+            user = await self._io(self.users.get, userid)
+            if user is None:
+                return json.dumps({"error": "User not found"}, indent=2)
+            symbols = await self._io(self.cost_basis.open_symbols, userid)
+            if stock_symbol:
+                symbols = [symbol for symbol in symbols if symbol == stock_symbol.upper()]
+            prices = await self.get_prices(symbols)
+            report = await self._io(self.cost_basis.report, userid, prices, user.get("portfolio"), stock_symbol)
+            return json.dumps(report, indent=2)
+        except Exception as e:
+            logging.error(f"Error computing profit and loss: {e}")
+            return json.dumps({"error": "Failed to compute profit and loss"}, indent=2)
 
-            user_found = False
-            for user in users:
-                if user.get("userid") == userid:
-                    user_found = True
+    async def _log_transaction(self, userid: str, stock_symbol: str, transaction_type: str, shares: int, price_per_share: float):
+        """Internal helper to log the transaction into the journal (or user_transaction.json in "json" mode)"""
+        await self._log_transactions(userid, [make_leg(stock_symbol, transaction_type, shares, price_per_share)])
 
-                    stock_info = await self.research_client.search(f"{stock_symbol} stock price in strictly one word. Such as '$100'")
-                    price_match = re.search(r"\$?(\d+\.?\d*)", stock_info)
-                    if not price_match:
-                        return json.dumps({"error": "Could not parse stock price."}, indent=2)
+    async def _log_transactions(self, userid: str, legs: list):
+        """Log several executed legs with one journal write (or one rewrite in "json" mode).
 
-                    current_price = float(price_match.group(1))
-                    total_cost = current_price * quantity
+        Raises if they couldn't be logged; the caller decides what happens to the trade.
+        """
+        new_transactions = [transaction_for_leg(userid, leg) for leg in legs]
 
-                    if user["bank_bal"] < total_cost:
-                        return json.dumps({"error": "Insufficient balance."}, indent=2)
+        if self.journal is not None:
+            await self._io(self.journal.append_many, new_transactions)
+            return
 
-                    user["bank_bal"] -= total_cost
+        async with transaction_file_lock:
+            # Load existing transactions
+            with span("storage.read_transactions", STORAGE_SECONDS, operation="read_transactions"):
+                async with aiofiles.open(TRANSACTION_PATH, "r") as f:
+                    content = await f.read()
+                    transactions = json.loads(content)
 
-                    portfolio = user.get("portfolio", {})
-                    portfolio[stock_symbol] = portfolio.get(stock_symbol, 0) + quantity
-                    user["portfolio"] = portfolio
+            # Ids continue from the highest one; the count collides once ids have gaps
+            last_id = max((int(tx["id"]) for tx in transactions), default=0)
+            for n, new_transaction in enumerate(new_transactions, 1):
+                transactions.append({"id": str(last_id + n), **new_transaction})
 
-                    # Log transaction
-                    await self._log_transaction(userid, stock_symbol, "buy", quantity, current_price)
+            # Save back
+            await self._io(atomic_write, TRANSACTION_PATH, json.dumps(transactions, indent=2))
 
-                    break
+    async def _sync_cost_basis(self):
+        """Bring the cost basis up to the log after a trade. A failure here only delays it to the next read."""
+        try:
+            await self._io(self.cost_basis.sync)
+        except Exception as e:
+            logging.error(f"Error updating the cost basis: {e}")
+
+    async def _apply_trades(self, userid: str, legs: list):
+        """Check and apply priced legs as one unit, then log them.
+
+        Returns None on success, or {"error", "stock_symbol"} for the leg that
+        failed (nothing is written). Prices are fetched by the caller, so the
+        per-user lock is only held for the checks and the write, never for a
+        price lookup.
+
+        The user record is written first and the legs logged after it; if
+        logging fails the record is put back as it was and the trade fails,
+        so a trade is never in the balance without its log entry, nor logged
+        without having changed the balance.
+        """
+        if self.sqlite is not None:
+            version = await self._io(self.users.version)
+            failure = await self._io(self.sqlite.trade_many, userid, legs)
+            if not failure:
+                user = await self._io(self.users.get, userid)
+                await self._io(self.valuation.update_user, user, version)
+                await self._sync_cost_basis()
+            return failure
+
+        async with user_locks(userid):
+            user = await self._io(self.users.get, userid)
+            if user is None:
+                return {"error": "User not found.", "stock_symbol": None}
+            original = copy.deepcopy(user)
+
+            failure = apply_legs(user, legs)
+            if failure:
+                return failure
+
+            version = await self._io(self.users.version)
+            await self._io(self.users.put, user)
+
+            # Log transactions
+            try:
+                await self._log_transactions(userid, legs)
+            except Exception as e:
+                logging.error(f"Error logging transaction, rolling back the trade: {e}")
+                await self._io(self.users.put, original)
+                return {"error": "Failed to record the trade.", "stock_symbol": None}
+
+            await self._io(self.valuation.update_user, user, version)
+        await self._sync_cost_basis()
+        return None
+
+    async def _apply_trade(self, userid: str, stock_symbol: str, transaction_type: str, quantity: int, current_price: float):
+        """Check and apply a single priced buy or sell. Returns an error message or None."""
+        failure = await self._apply_trades(userid, [make_leg(stock_symbol, transaction_type, quantity, current_price)])
+        return failure["error"] if failure else None
 
-            if not user_found:
+    async def buy_stock_for_user(self, userid: str, stock_symbol: str, quantity: int) -> str:
+        try:
+            user = await self._io(self.users.get, userid)
+            if user is None:
                 return json.dumps({"error": "User not found."}, indent=2)
 
-            async with aiofiles.open("C:\\Users\\Administrator\\Downloads\\TrevorAI\\trevorai-backend\\data\\user_data.json", "w") as f:
-                await f.write(json.dumps(users, indent=2))
+            current_price = await self.get_stock_price(stock_symbol)
+            if current_price is None:
+                return json.dumps({"error": "Could not parse stock price."}, indent=2)
+
+            error = await self._apply_trade(userid, stock_symbol, "buy", quantity, current_price)
+            if error:
+                return json.dumps({"error": error}, indent=2)
 
             return json.dumps({"message": "Stock purchased successfully."}, indent=2)
 
@@ -101,48 +222,60 @@ class DBHandler:
 
     async def sell_stock_for_user(self, userid: str, stock_symbol: str, quantity: int) -> str:
         try:
-            async with aiofiles.open("C:\\Users\\Administrator\\Downloads\\TrevorAI\\trevorai-backend\\data\\user_data.json", "r") as f:
-                content = await f.read()
-                users = json.loads(content)
-
-            user_found = False
-            for user in users:
-                if user.get("userid") == userid:
-                    user_found = True
-
-                    stock_info = await self.research_client.search(f"{stock_symbol} stock price in strictly one word. Such as '$100'")
-                    price_match = re.search(r"\$?(\d+\.?\d*)", stock_info)
-                    if not price_match:
-                        return json.dumps({"error": "Could not parse stock price."}, indent=2)
-
-                    current_price = float(price_match.group(1))
-                    total_gain = current_price * quantity
-
-                    portfolio = user.get("portfolio", {})
+            user = await self._io(self.users.get, userid)
+            if user is None:
+                return json.dumps({"error": "User not found."}, indent=2)
 
-                    if portfolio.get(stock_symbol, 0) < quantity:
-                        return json.dumps({"error": "Not enough stock to sell."}, indent=2)
+            current_price = await self.get_stock_price(stock_symbol)
+            if current_price is None:
+                return json.dumps({"error": "Could not parse stock price."}, indent=2)
 
-                    portfolio[stock_symbol] -= quantity
-                    if portfolio[stock_symbol] == 0:
-                        del portfolio[stock_symbol]
+            error = await self._apply_trade(userid, stock_symbol, "sell", quantity, current_price)
+            if error:
+                return json.dumps({"error": error}, indent=2)
 
-                    user["portfolio"] = portfolio
-                    user["bank_bal"] += total_gain
+            return json.dumps({"message": "Stock sold successfully."}, indent=2)
 
-                    # Log transaction
-                    await self._log_transaction(userid, stock_symbol, "sell", quantity, current_price)
+        except Exception as e:
+            logging.error(f"Error selling stock: {e}")
+            return json.dumps({"error": "Failed to sell stock."}, indent=2)
 
-                    break
+    async def trade_basket_for_user(self, userid: str, trades: list) -> str:
+        """Execute several buy/sell legs as one all-or-nothing basket.
 
-            if not user_found:
+        trades is a list of {"stock_symbol", "action": "buy" | "sell", "quantity"}.
+        All legs are priced concurrently, validated together (sells fund buys)
+        and committed with a single write and a single batch of log entries.
+        """
+        try:
+            user = await self._io(self.users.get, userid)
+            if user is None:
                 return json.dumps({"error": "User not found."}, indent=2)
-
-            async with aiofiles.open("C:\\Users\\Administrator\\Downloads\\TrevorAI\\trevorai-backend\\data\\user_data.json", "w") as f:
-                await f.write(json.dumps(users, indent=2))
-
-            return json.dumps({"message": "Stock sold successfully."}, indent=2)
+            if not trades:
+                return json.dumps({"error": "No trades given."}, indent=2)
+
+            symbols = list(dict.fromkeys(trade["stock_symbol"] for trade in trades))
+            prices = dict(zip(symbols, await asyncio.gather(*[self.get_stock_price(symbol) for symbol in symbols])))
+            unpriced = sorted(symbol for symbol, price in prices.items() if price is None)
+            if unpriced:
+                return json.dumps({"error": f"Could not parse stock price for {', '.join(unpriced)}."}, indent=2)
+
+            legs = [
+                make_leg(trade["stock_symbol"], trade["action"], int(trade["quantity"]), prices[trade["stock_symbol"]])
+                for trade in trades
+            ]
+            failure = await self._apply_trades(userid, legs)
+            if failure:
+                return json.dumps(failure, indent=2)
+
+            return json.dumps({
+                "message": "Basket executed successfully.",
+                "trades": [
+                    {"stock_symbol": leg["stock_symbol"], "action": leg["type"], "quantity": leg["shares"], "price_per_share": leg["price_per_share"]}
+                    for leg in legs
+                ],
+            }, indent=2)
 
         except Exception as e:
-            logging.error(f"Error selling stock: {e}")
-            return json.dumps({"error": "Failed to sell stock."}, indent=2)
+            logging.error(f"Error executing trade basket: {e}")
+            return json.dumps({"error": "Failed to execute trade basket."}, indent=2)
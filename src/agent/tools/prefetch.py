@@ -0,0 +1,117 @@
+import os
+import re
+import asyncio
+import logging
+from typing import List
+
+from tools.symbol_index import get_symbol_index, normalize_name
+
+# Most prefetches one call may start, and how many may run at once
+PREFETCH_LIMIT = int(os.getenv("TREVOR_PREFETCH_LIMIT", "24"))
+PREFETCH_CONCURRENCY = int(os.getenv("TREVOR_PREFETCH_CONCURRENCY", "4"))
+
+_name_pattern = None  # built from the symbol index on first use
+# "$NVDA" or a bare upper-case word we know to be a symbol
+_TICKER_PATTERN = re.compile(r"\$([A-Za-z]{1,5})\b|\b([A-Z]{2,5})\b")
+# User IDs are 5-8 capital letters and digits with at least one of each (FYJ57, GH78R5V)
+_USERID_PATTERN = re.compile(r"\b(?=[A-Z0-9]*\d)(?=[A-Z0-9]*[A-Z])[A-Z0-9]{5,8}\b")
+# ASR spells IDs and tickers out letter by letter: "f y j 5 7", "N-V-D-A"
+_SPELLED_PATTERN = re.compile(r"\b(?:[A-Za-z0-9][\s\-.]+){2,}[A-Za-z0-9]\b")
+
+
+def scan_utterance(text: str):
+    """(symbols, userids) mentioned in one utterance, in order of appearance."""
+    index = get_symbol_index()
+    global _name_pattern
+    if _name_pattern is None:
+        _name_pattern = index.name_pattern()
+    collapsed = _SPELLED_PATTERN.sub(lambda m: re.sub(r"[\s\-.]", "", m.group(0)).upper(), text)
+    # Only exact names and aliases here: fuzzy matching free speech would prefetch noise
+    symbols = [index.resolve(m.group(1)) for m in _name_pattern.finditer(normalize_name(collapsed))]
+    for match in _TICKER_PATTERN.finditer(collapsed):
+        symbol = (match.group(1) or match.group(2)).upper()
+        if symbol in index.listings:
+            symbols.append(symbol)
+    userids = _USERID_PATTERN.findall(collapsed.upper())
+    return list(dict.fromkeys(symbols)), list(dict.fromkeys(userids))
+
+
+class SpeculativePrefetcher:
+    """Warms the quote cache and user store from the live transcript, before a tool is asked for.
+
+    observe() is fed every transcript update of one call. It scans the latest
+    user utterance for tickers, company names and user IDs and starts
+    background lookups through the same DBHandler the tools use, so the price
+    lands in the shared price_cache and the store is loaded by the time
+    quick_stock_check, get_user_profile or a trade runs. A recognized user's
+    holdings are priced too. Each symbol or user is fetched at most once per
+    call, at most PREFETCH_LIMIT lookups are started per call and
+    PREFETCH_CONCURRENCY run at a time. Nothing is ever written.
+    """
+
+    def __init__(self, db_handler, limit: int = PREFETCH_LIMIT, concurrency: int = PREFETCH_CONCURRENCY):
+        self.db_handler = db_handler
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._seen = set()  # ("quote", symbol) / ("user", userid) already started this call
+        self._tasks = set()
+        self._last_utterance = None
+        self.started = 0
+
+    def observe(self, transcript: List):
+        """Scan the newest user utterance of transcript and start lookups for what it mentions."""
+        utterance = next((u for u in reversed(transcript) if _field(u, "role") == "user"), None)
+        if utterance is None:
+            return
+        text = _field(utterance, "content") or ""
+        if text == self._last_utterance:
+            return  # an update that didn't change what the user said
+        self._last_utterance = text
+        symbols, userids = scan_utterance(text)
+        for userid in userids:
+            self._start(("user", userid), self._prefetch_user(userid))
+        for symbol in symbols:
+            self._start(("quote", symbol), self._prefetch_quote(symbol))
+
+    def _start(self, key, coro):
+        if key in self._seen or self.started >= self.limit:
+            coro.close()
+            return
+        self._seen.add(key)
+        self.started += 1
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _prefetch_quote(self, symbol: str):
+        try:
+            async with self._semaphore:
+                await self.db_handler.get_quote(symbol)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Prefetching {symbol} failed: {e}")
+
+    async def _prefetch_user(self, userid: str):
+        try:
+            async with self._semaphore:
+                user = await asyncio.to_thread(self.db_handler.users.get, userid)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Prefetching user {userid} failed: {e}")
+            return
+        if user is None:
+            return  # not a user ID after all
+        for symbol in user.get("portfolio", {}):
+            self._start(("quote", symbol.upper()), self._prefetch_quote(symbol.upper()))
+
+    def cancel(self):
+        """Stop every lookup still running, e.g. when the call ends."""
+        for task in list(self._tasks):
+            task.cancel()
+
+
+def _field(utterance, name):
+    # Transcripts arrive as dicts from the websocket and as Utterance models in requests
+    return utterance.get(name) if isinstance(utterance, dict) else getattr(utterance, name, None)
@@ -0,0 +1,181 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+QUOTE_TTL = float(os.getenv("TREVOR_QUOTE_TTL", "60"))
+# How long past the TTL a quote may still be served while it is refreshed in the background
+QUOTE_STALE_TTL = float(os.getenv("TREVOR_QUOTE_STALE_TTL", "240"))
+# Entries kept per cache; the least recently used are evicted past this
+QUOTE_CACHE_ENTRIES = int(os.getenv("TREVOR_QUOTE_CACHE_ENTRIES", "4096"))
+
+
+class QuoteCache:
+    """TTL cache for price lookups with stale-while-revalidate and single-flight loads.
+
+    get(key, fetch) returns a fresh entry straight away. An entry past its TTL
+    but inside the stale window is returned too, while one background refresh
+    runs. On a miss, all concurrent callers for the same key share one fetch.
+    A fetch that returns None is not cached. At most max_entries are kept,
+    least recently used evicted first, and the same bound applies to the
+    record of recently requested keys. Subclasses can keep entries
+    elsewhere by overriding _lookup/_store (and clock, if entries must
+    outlive the process).
+    """
+
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, ttl: float = QUOTE_TTL, stale_ttl: float = QUOTE_STALE_TTL, max_entries: int = QUOTE_CACHE_ENTRIES):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, fetched_at), least recently used first
+        self._inflight = {}  # key -> asyncio.Task
+        # key -> clock() of the last get, oldest first, for refreshers deciding what is hot
+        self._requested = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def normalize(key: str) -> str:
+        return key.strip().upper()
+
+    async def get(self, key: str, fetch, allow_stale: bool = True):
+        """Return the cached value for key, calling fetch() (a coroutine function) to load it.
+
+        With allow_stale=False an entry past its TTL is never returned; the
+        caller waits for the (shared) refresh instead.
+        """
+        key = self.normalize(key)
+        self._record_request(key, self.clock())
+        entry = self._lookup(key)
+        if entry is not None:
+            age = self.clock() - entry[1]
+            if age < self.ttl:
+                self.hits += 1
+                return entry[0]
+            if allow_stale and age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._load(key, fetch)
+                return entry[0]
+        self.misses += 1
+        # Shield the shared fetch so one caller cancelling doesn't fail the others
+        return await asyncio.shield(self._load(key, fetch))
+
+    async def get_many(self, keys: list, fetch_many, allow_stale: bool = True) -> dict:
+        """{key: value} for the keys that have one, like get() for each key but
+        with a single fetch_many(keys) call for every key that needs loading.
+
+        fetch_many is a coroutine function taking a list of keys and returning
+        {key: value}; keys it leaves out get no value and aren't cached.
+        """
+        now = self.clock()
+        values, load, wait = {}, [], []
+        for key in dict.fromkeys(self.normalize(key) for key in keys):
+            self._record_request(key, now)
+            entry = self._lookup(key)
+            age = now - entry[1] if entry is not None else None
+            if age is not None and age < self.ttl:
+                self.hits += 1
+                values[key] = entry[0]
+                continue
+            if age is not None and allow_stale and age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                values[key] = entry[0]  # refreshed in the background with the rest
+            else:
+                self.misses += 1
+                wait.append(key)
+            load.append(key)
+
+        batch = None
+        fetch = [key for key in load if key not in self._inflight]
+        if fetch:
+            batch = asyncio.ensure_future(fetch_many(fetch))
+        # Keys already being loaded join that load; the rest share the batch
+        tasks = {key: self._load(key, lambda key=key: self._pick(batch, key)) for key in load}
+        results = await asyncio.gather(*[asyncio.shield(tasks[key]) for key in wait], return_exceptions=True)
+        for key, result in zip(wait, results):
+            if result is not None and not isinstance(result, BaseException):
+                values[key] = result
+        return values
+
+    @staticmethod
+    async def _pick(batch: asyncio.Future, key: str):
+        # Shielded so one key's load being cancelled doesn't cancel the batch for the others
+        return (await asyncio.shield(batch)).get(key)
+
+    def _load(self, key: str, fetch) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task
+        task = asyncio.create_task(self._fetch(key, fetch))
+        task.add_done_callback(self._log_failure)
+        self._inflight[key] = task
+        return task
+
+    async def _fetch(self, key: str, fetch):
+        try:
+            value = await fetch()
+            if value is not None:
+                self._store(key, (value, self.clock()))
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def put(self, key: str, value):
+        """Store a value fetched elsewhere (e.g. by a background refresher) as fresh."""
+        if value is not None:
+            self._store(self.normalize(key), (value, self.clock()))
+
+    def requested_since(self, seconds: float) -> list:
+        """Keys asked for within the last seconds, dropping older ones from the record."""
+        cutoff = self.clock() - seconds
+        self._requested = OrderedDict((key, at) for key, at in self._requested.items() if at >= cutoff)
+        return list(self._requested)
+
+    def _record_request(self, key: str, at: float):
+        self._requested[key] = at
+        self._requested.move_to_end(key)
+        while len(self._requested) > self.max_entries:
+            self._requested.popitem(last=False)
+
+    def requests(self) -> int:
+        """Total get() calls so far."""
+        return self.hits + self.stale_hits + self.misses
+
+    def _lookup(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Quote lookup failed: {task.exception()}")
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+
+# Process-wide caches shared by every call: numeric prices per symbol for trades,
+# and the spoken price answer per company for quick_stock_check.
+price_cache = QuoteCache()
+stock_check_cache = QuoteCache()
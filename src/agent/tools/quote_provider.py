@@ -0,0 +1,179 @@
+import os
+import re
+import json
+import time
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+from storage.paths import QUOTES_PATH
+
+# Comma-grouped ("1,234.50") or plain ("1234.5") prices, optionally with a leading "$"
+PRICE_PATTERN = r"\$?\s*(\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)"
+
+
+def parse_price(text: str) -> Optional[float]:
+    """First price in a free-text answer, or None."""
+    match = re.search(PRICE_PATTERN, text or "")
+    return float(match.group(1).replace(",", "")) if match else None
+
+
+@dataclass(frozen=True)
+class Quote:
+    symbol: str
+    price: float
+    timestamp: float  # unix seconds the price is valid as of
+    source: str
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class QuoteProvider(ABC):
+    """Source of stock quotes. Subclasses implement get_quotes for a batch of symbols."""
+
+    name = "base"
+
+    @abstractmethod
+    async def get_quotes(self, symbols: List[str]) -> Dict[str, Quote]:
+        """Return quotes keyed by upper-case symbol. Symbols the provider doesn't know are left out."""
+
+    async def get_quote(self, symbol: str) -> Optional[Quote]:
+        quotes = await self.get_quotes([symbol])
+        return quotes.get(symbol.strip().upper())
+
+
+class FileQuoteProvider(QuoteProvider):
+    """Quotes from a local JSON file, re-read when the file changes.
+
+    A {symbol: price} file is a fixture whose prices are stamped with the
+    file's mtime, so in the agent this provider is opt-in
+    (TREVOR_QUOTE_PROVIDERS=file,search) for tests and offline runs where
+    trades should complete in milliseconds. Entries may also be
+    {price, timestamp, source}, as in the snapshot QuoteRefresher publishes,
+    and keep their own as-of time.
+    """
+
+    name = "file"
+
+    def __init__(self, file_path: str = QUOTES_PATH):
+        self.file_path = file_path
+        self._prices = {}
+        self._signature = None
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            self._prices, self._signature = {}, None
+            return
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+        with open(self.file_path, "r") as f:
+            prices = json.load(f)
+        self._prices = {}
+        for symbol, entry in prices.items():
+            if isinstance(entry, dict):
+                self._prices[symbol.upper()] = (
+                    float(entry["price"]), float(entry.get("timestamp", stat.st_mtime)), entry.get("source", self.name)
+                )
+            else:
+                self._prices[symbol.upper()] = (float(entry), stat.st_mtime, self.name)
+        self._signature = signature
+
+    def prices(self) -> Dict[str, float]:
+        """Every {symbol: price} in the file, for synchronous callers such as the Flask backend."""
+        self._refresh()
+        return {symbol: price for symbol, (price, _, _) in self._prices.items()}
+
+    def quotes(self) -> Dict[str, Quote]:
+        """Every quote in the file, with its as-of time, for synchronous callers."""
+        self._refresh()
+        return {symbol: Quote(symbol, *entry) for symbol, entry in self._prices.items()}
+
+    def version(self):
+        """Changes whenever the quotes file does."""
+        self._refresh()
+        return self._signature
+
+    async def get_quotes(self, symbols: List[str]) -> Dict[str, Quote]:
+        self._refresh()
+        quotes = {}
+        for symbol in symbols:
+            symbol = symbol.strip().upper()
+            if symbol in self._prices:
+                quotes[symbol] = Quote(symbol, *self._prices[symbol])
+        return quotes
+
+
+class SearchQuoteProvider(QuoteProvider):
+    """Quotes from a web-search LLM answer. Slow, so it is meant to be the last fallback."""
+
+    name = "search"
+
+    def __init__(self, search_api):
+        self.search_api = search_api
+
+    async def get_quotes(self, symbols: List[str]) -> Dict[str, Quote]:
+        symbols = [symbol.strip().upper() for symbol in symbols]
+        if len(symbols) == 1:
+            answer = await self.search_api.search(f"{symbols[0]} stock price in strictly one word. Such as '$100'")
+            price = parse_price(answer)
+            return {symbols[0]: Quote(symbols[0], price, time.time(), self.name)} if price is not None else {}
+
+        answer = await self.search_api.search(
+            f"Current stock prices of {', '.join(symbols)}. "
+            "Answer with exactly one line per symbol in the form 'SYMBOL: $price' and nothing else."
+        )
+        quotes = {}
+        now = time.time()
+        for line in answer.splitlines():
+            match = re.match(r"\W*([A-Za-z][A-Za-z.\-]*)\W*[:=\-]\s*" + PRICE_PATTERN, line.strip())
+            if match and match.group(1).upper() in symbols:
+                symbol = match.group(1).upper()
+                quotes[symbol] = Quote(symbol, float(match.group(2).replace(",", "")), now, self.name)
+        return quotes
+
+
+class FallbackQuoteProvider(QuoteProvider):
+    """Ask each provider in turn for the symbols the previous ones couldn't price."""
+
+    name = "fallback"
+
+    def __init__(self, providers: List[QuoteProvider]):
+        self.providers = providers
+
+    async def get_quotes(self, symbols: List[str]) -> Dict[str, Quote]:
+        quotes = {}
+        missing = [symbol.strip().upper() for symbol in symbols]
+        for provider in self.providers:
+            if not missing:
+                break
+            try:
+                quotes.update(await provider.get_quotes(missing))
+            except Exception as e:
+                logging.error(f"Quote provider {provider.name} failed: {e}")
+            missing = [symbol for symbol in missing if symbol not in quotes]
+        return quotes
+
+
+def quote_provider_names() -> List[str]:
+    """Providers named by TREVOR_QUOTE_PROVIDERS, in the order they are asked."""
+    return [name.strip() for name in os.getenv("TREVOR_QUOTE_PROVIDERS", "search").split(",") if name.strip()]
+
+
+def build_quote_provider(search_api, live_only: bool = False) -> QuoteProvider:
+    """Provider chain named by TREVOR_QUOTE_PROVIDERS (default "search"; "file,search" for tests and offline runs).
+
+    live_only leaves out the file fixture, for callers that publish quotes as fresh.
+    """
+    available = {
+        "file": lambda: FileQuoteProvider(),
+        "search": lambda: SearchQuoteProvider(search_api),
+    }
+    names = quote_provider_names()
+    if live_only:
+        names = [name for name in names if name != "file"]
+    return FallbackQuoteProvider([available[name]() for name in names])
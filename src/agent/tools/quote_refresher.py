@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import asyncio
+import logging
+
+from storage.atomic_file import atomic_write
+from storage.paths import LIVE_QUOTES_PATH
+from tools.quote_cache import QUOTE_TTL, price_cache
+from tools.symbol_index import get_symbol_index
+
+# Seconds between refreshes normally, when many calls are asking for prices, and at most
+REFRESH_INTERVAL = float(os.getenv("TREVOR_REFRESH_INTERVAL", str(QUOTE_TTL * 0.75)))
+REFRESH_MIN_INTERVAL = float(os.getenv("TREVOR_REFRESH_MIN_INTERVAL", "15"))
+REFRESH_MAX_INTERVAL = float(os.getenv("TREVOR_REFRESH_MAX_INTERVAL", "600"))
+# Symbols per upstream request, and upstream requests allowed per hour
+REFRESH_BATCH_SIZE = int(os.getenv("TREVOR_REFRESH_BATCH_SIZE", "25"))
+REFRESH_MAX_BATCHES_PER_HOUR = int(os.getenv("TREVOR_REFRESH_MAX_BATCHES_PER_HOUR", "240"))
+# Price lookups per refresh interval that count as busy, and how long a requested symbol stays hot
+REFRESH_BUSY_REQUESTS = int(os.getenv("TREVOR_REFRESH_BUSY_REQUESTS", "20"))
+REFRESH_RECENT_WINDOW = float(os.getenv("TREVOR_REFRESH_RECENT_WINDOW", "900"))
+
+
+class QuoteRefresher:
+    """Keeps quotes for held and recently requested symbols fresh in price_cache.
+
+    Every cycle it takes the union of the symbols in any portfolio and those
+    asked for in the last recent_window seconds, fetches them in batches
+    through the DBHandler's live provider chain (never the file fixture)
+    and puts the quotes in the cache, so calls find them fresh instead of
+    fetching mid-conversation. Every quote it has fetched is also published
+    to snapshot_path with its as-of time, for the Flask backend to value
+    portfolios at.
+
+    The interval adapts: busy (many lookups since the last cycle) drops it
+    to min_interval, idle doubles it up to max_interval, and a failed or
+    empty refresh, or running out of the hourly batch budget, backs off the
+    same way.
+    """
+
+    def __init__(self, db_handler, cache=price_cache, interval: float = REFRESH_INTERVAL,
+                 min_interval: float = REFRESH_MIN_INTERVAL, max_interval: float = REFRESH_MAX_INTERVAL,
+                 batch_size: int = REFRESH_BATCH_SIZE, max_batches_per_hour: int = REFRESH_MAX_BATCHES_PER_HOUR,
+                 busy_requests: int = REFRESH_BUSY_REQUESTS, recent_window: float = REFRESH_RECENT_WINDOW,
+                 snapshot_path: str = LIVE_QUOTES_PATH):
+        self.db_handler = db_handler
+        self.cache = cache
+        self.snapshot_path = snapshot_path
+        self._published = {}  # symbol -> latest Quote, written to snapshot_path
+        self.base_interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.batch_size = batch_size
+        self.max_batches_per_hour = max_batches_per_hour
+        self.busy_requests = busy_requests
+        self.recent_window = recent_window
+        self.interval = interval
+        self._batch_times = []  # time.monotonic() of each batch in the last hour
+        self._last_requests = 0
+        self._task = None
+        self.cycles = 0
+        self.refreshed = 0
+        self.failures = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                ok = await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Quote refresh failed: {e}")
+                ok = False
+            self.interval = self._next_interval(ok)
+            await asyncio.sleep(self.interval)
+
+    def _next_interval(self, ok: bool) -> float:
+        requests = self.cache.requests()
+        recent, self._last_requests = requests - self._last_requests, requests
+        if not ok:
+            self.failures += 1
+            return min(self.interval * 2, self.max_interval)
+        if recent >= self.busy_requests:
+            return self.min_interval
+        if recent == 0:
+            return min(self.interval * 2, self.max_interval)
+        return self.base_interval
+
+    async def symbols(self) -> list:
+        """Symbols to keep warm: everything held plus what callers asked for recently."""
+        users = await asyncio.to_thread(self.db_handler.users.all)
+        held = {symbol.upper() for user in users for symbol in user.get("portfolio", {})}
+        # Cache keys can also be unresolved company names; only refresh real symbols
+        listed = get_symbol_index().listings
+        recent = {key for key in self.cache.requested_since(self.recent_window) if key in listed}
+        return sorted(held | recent)
+
+    def _take_batch_budget(self) -> bool:
+        now = time.monotonic()
+        self._batch_times = [at for at in self._batch_times if now - at < 3600]
+        if len(self._batch_times) >= self.max_batches_per_hour:
+            return False
+        self._batch_times.append(now)
+        return True
+
+    async def refresh(self) -> bool:
+        """Run one refresh cycle. Returns False if nothing could be refreshed."""
+        self.cycles += 1
+        symbols = await self.symbols()
+        if not symbols or not self.db_handler.live_quotes.providers:
+            return True
+        refreshed = 0
+        for start in range(0, len(symbols), self.batch_size):
+            if not self._take_batch_budget():
+                logging.error("Quote refresh budget for this hour used up")
+                break
+            quotes = await self.db_handler.live_quotes.get_quotes(symbols[start:start + self.batch_size])
+            for symbol, quote in quotes.items():
+                self.cache.put(symbol, quote)
+            self._published.update(quotes)
+            refreshed += len(quotes)
+        self.refreshed += refreshed
+        if refreshed:
+            await asyncio.to_thread(self._publish)
+        return refreshed > 0
+
+    def _publish(self):
+        snapshot = {symbol: {"price": quote.price, "timestamp": quote.timestamp, "source": quote.source}
+                    for symbol, quote in self._published.items()}
+        try:
+            atomic_write(self.snapshot_path, json.dumps(snapshot, indent=2))
+        except OSError as e:
+            logging.error(f"Error publishing quotes to {self.snapshot_path}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval": self.interval,
+            "cycles": self.cycles,
+            "refreshed": self.refreshed,
+            "failures": self.failures,
+        }
@@ -0,0 +1,95 @@
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+
+from storage.atomic_file import atomic_write
+from storage.paths import RESEARCH_CACHE_DIR
+from tools.quote_cache import QuoteCache
+from tools.symbol_index import resolve_symbol
+
+RESEARCH_TTL = float(os.getenv("TREVOR_RESEARCH_TTL", "900"))
+# How long past the TTL a research answer may still be served while it is refreshed
+RESEARCH_STALE_TTL = float(os.getenv("TREVOR_RESEARCH_STALE_TTL", "3600"))
+RESEARCH_CACHE_ENTRIES = int(os.getenv("TREVOR_RESEARCH_CACHE_ENTRIES", "256"))
+RESEARCH_CACHE_DISK_ENTRIES = int(os.getenv("TREVOR_RESEARCH_CACHE_DISK_ENTRIES", "2048"))
+
+
+def research_key(company_name: str) -> str:
+    """Cache key for a company: its symbol when we know it, so "Tesla" and "TSLA" share an entry."""
+    return resolve_symbol(company_name) or re.sub(r"[^A-Za-z0-9]+", " ", company_name).strip().upper()
+
+
+class ResearchCache(QuoteCache):
+    """QuoteCache for deep research answers, kept in memory and on disk.
+
+    The memory tier is QuoteCache's LRU of max_entries; every entry is also written to
+    one JSON file in cache_dir (at most max_disk_entries, oldest evicted), so
+    a restarted process answers popular companies without a research pass.
+    Ages use wall-clock time so they stay meaningful across restarts.
+    Stale-while-revalidate and single-flight loads come from QuoteCache.
+    """
+
+    clock = staticmethod(time.time)
+
+    def __init__(self, cache_dir: str = RESEARCH_CACHE_DIR, ttl: float = RESEARCH_TTL,
+                 stale_ttl: float = RESEARCH_STALE_TTL, max_entries: int = RESEARCH_CACHE_ENTRIES,
+                 max_disk_entries: int = RESEARCH_CACHE_DISK_ENTRIES):
+        super().__init__(ttl, stale_ttl, max_entries)
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self.disk_hits = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, re.sub(r"[^A-Z0-9]+", "_", key) + ".json")
+
+    def _lookup(self, key: str):
+        entry = super()._lookup(key)
+        if entry is not None:
+            return entry
+        try:
+            with open(self._path(key), "r") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.error(f"Ignoring unreadable research cache entry for {key}: {e}")
+            return None
+        if stored.get("key") != key or self.clock() - stored["fetched_at"] >= self.ttl + self.stale_ttl:
+            return None
+        self.disk_hits += 1
+        entry = (stored["value"], stored["fetched_at"])
+        super()._store(key, entry)
+        return entry
+
+    def _store(self, key: str, entry):
+        super()._store(key, entry)
+        asyncio.get_running_loop().run_in_executor(None, self._write, key, entry)
+
+    def _write(self, key: str, entry):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            atomic_write(self._path(key), json.dumps({"key": key, "value": entry[0], "fetched_at": entry[1]}))
+            self._evict_disk()
+        except Exception as e:
+            logging.error(f"Could not save research cache entry for {key}: {e}")
+
+    def _evict_disk(self):
+        files = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".json")]
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files) - self.max_disk_entries]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        return {**super().stats(), "disk_hits": self.disk_hits}
+
+
+# Process-wide, shared by every call like the quote caches
+research_cache = ResearchCache()
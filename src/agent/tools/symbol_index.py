@@ -0,0 +1,177 @@
+import os
+import re
+import json
+import bisect
+import difflib
+import logging
+import threading
+from typing import Optional
+
+from storage.paths import LISTINGS_PATH
+
+# Words that don't tell companies apart: "NVIDIA Corporation" and "Nvidia Corp" are the same name
+_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "companies", "ltd", "limited", "plc",
+    "holding", "holdings", "group", "sa", "ag", "nv", "the", "class", "a", "b", "stock", "stocks", "shares",
+}
+# Spelling similarity (difflib ratio, spaces ignored) a phonetic match also needs: short sound keys
+# collide across unrelated names ("lyft" ~ "alphabet", "amgen" ~ "amazon"), ASR spellings don't drift that far
+_PHONETIC_MIN_SIMILARITY = 0.6
+# Soundex consonant classes; vowels, h, w and y carry no sound class
+_SOUND_CLASSES = {
+    **dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"), **dict.fromkeys("dt", "3"),
+    "l": "4", **dict.fromkeys("mn", "5"), "r": "6",
+}
+
+
+def normalize_name(text: str) -> str:
+    """Lower-case words without punctuation or corporate suffixes ("The Walt Disney Company" -> "walt disney")."""
+    text = text.lower().replace("&", " and ").replace(".com", "")
+    words = re.sub(r"[^a-z0-9]+", " ", text).split()
+    kept = [word for word in words if word not in _SUFFIXES]
+    return " ".join(kept or words)
+
+
+def sound_key(name: str) -> str:
+    """Consonant sound classes of a whole name, so ASR spellings collide ("in video" ~ "nvidia")."""
+    key = []
+    for char in name.replace(" ", ""):
+        code = _SOUND_CLASSES.get(char, "" if char.isalpha() else char)
+        if code and (not key or key[-1] != code):
+            key.append(code)
+    return "".join(key)
+
+
+class SymbolIndex:
+    """In-process company name -> symbol index built from a listing file.
+
+    The file is a JSON list of {"symbol", "name", "aliases"}. resolve() tries,
+    in order: the symbol itself, the exact normalized name or alias, a
+    unique name prefix ("berkshire"), a unique phonetic match that is also
+    spelled alike and finally a close spelling. Results are memoized, so repeat lookups are a dict hit.
+    Trades go through exact_symbol() instead, which never guesses.
+    """
+
+    def __init__(self, file_path: str = LISTINGS_PATH):
+        self.file_path = file_path
+        self.listings = {}  # symbol -> {"symbol", "name", "aliases"}
+        self._names = {}    # normalized name or alias -> symbol
+        self._spellings = {}  # name or alias exactly as listed -> symbol
+        self._sorted_names = []
+        self._sounds = {}   # sound_key -> {symbols}
+        self._symbol_names = {}  # symbol -> [normalized names and aliases]
+        self._memo = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.file_path, "r") as f:
+                listings = json.load(f)
+        except FileNotFoundError:
+            logging.error(f"Listing file {self.file_path} not found; company names won't be resolved")
+            listings = []
+        for listing in listings:
+            symbol = listing["symbol"].upper()
+            self.listings[symbol] = listing
+            for name in [listing["name"], *listing.get("aliases", [])]:
+                self._spellings.setdefault(name.strip(), symbol)
+                normalized = normalize_name(name)
+                self._names.setdefault(normalized, symbol)
+                self._symbol_names.setdefault(symbol, []).append(normalized)
+                self._sounds.setdefault(sound_key(normalized), set()).add(symbol)
+        self._sorted_names = sorted(self._names)
+
+    def resolve(self, text: str) -> Optional[str]:
+        """Symbol for a company name, alias or symbol, or None if there is no confident match."""
+        if text in self._memo:
+            return self._memo[text]
+        symbol = self._resolve(text)
+        if len(self._memo) > 10000:
+            self._memo.clear()
+        self._memo[text] = symbol
+        return symbol
+
+    def _resolve(self, text: str) -> Optional[str]:
+        candidate = text.strip().lstrip("$").upper()
+        if candidate in self.listings:
+            return candidate
+        name = normalize_name(text)
+        if not name:
+            return None
+        if name in self._names:
+            return self._names[name]
+
+        if len(name) >= 3:
+            start = bisect.bisect_left(self._sorted_names, name)
+            matches = set()
+            for other in self._sorted_names[start:]:
+                if not other.startswith(name):
+                    break
+                matches.add(self._names[other])
+            if len(matches) == 1:
+                return matches.pop()
+
+        key = sound_key(name)
+        matches = self._sounds.get(key, set())
+        if len(key) >= 3 and len(matches) == 1:
+            symbol = next(iter(matches))
+            spoken = name.replace(" ", "")
+            similarity = max(
+                difflib.SequenceMatcher(None, spoken, other.replace(" ", "")).ratio() for other in self._symbol_names[symbol]
+            )
+            if similarity >= _PHONETIC_MIN_SIMILARITY:
+                return symbol
+
+        close = difflib.get_close_matches(name, self._sorted_names, n=2, cutoff=0.8)
+        if close and (len(close) == 1 or self._names[close[0]] == self._names[close[1]]):
+            return self._names[close[0]]
+        return None
+
+    def exact_symbol(self, text: str) -> Optional[str]:
+        """Symbol for a listed symbol or an exact name or alias, with no prefix, phonetic or spelling guesses.
+
+        Text written like a ticker ("PINS", "BLOCK") only matches a listed
+        symbol or an alias spelled exactly that way ("TSMC"), so an unlisted
+        ticker is never taken for a company name.
+        """
+        text = text.strip().lstrip("$")
+        if text.upper() in self.listings:
+            return text.upper()
+        if text.isupper() and " " not in text:
+            return self._spellings.get(text)
+        return self._names.get(normalize_name(text))
+
+    def canonical_symbol(self, text: str) -> str:
+        """The symbol for text by exact_symbol(), or text upper-cased as given; safe for trades."""
+        return self.exact_symbol(text) or text.strip().lstrip("$").upper()
+
+    def canonical_name(self, text: str) -> str:
+        """The listed company name for text, or text unchanged if it can't be resolved."""
+        symbol = self.resolve(text)
+        return self.listings[symbol]["name"] if symbol else text
+
+    def name_pattern(self) -> re.Pattern:
+        """Regex over normalized text matching any listed name or alias as whole words."""
+        names = sorted(self._names, key=len, reverse=True)
+        if not names:
+            return re.compile(r"(?!)")  # matches nothing
+        return re.compile(r"\b(" + "|".join(re.escape(name) for name in names) + r")\b")
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_symbol_index(file_path: str = LISTINGS_PATH) -> SymbolIndex:
+    """Return the process-wide SymbolIndex for file_path, creating it on first use."""
+    key = os.path.abspath(file_path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = SymbolIndex(key)
+        return index
+
+
+def resolve_symbol(company_name: str) -> Optional[str]:
+    """Symbol for a company name or symbol, or None if unknown."""
+    return get_symbol_index().resolve(company_name)
@@ -1,27 +1,25 @@
 import os
 import logging
 import asyncio
-from openai import AsyncOpenAI
-from dotenv import load_dotenv
+from clients import get_clients
+from tracing import LLM_SECONDS, span
 
 class SearchAPI:
-    def __init__(self):
-        load_dotenv()
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables.")
-        self.client = AsyncOpenAI(api_key=self.api_key)
+    def __init__(self, clients=None):
+        # The shared OpenAI client from the process-wide ClientRegistry
+        self.client = (clients or get_clients()).openai
 
     async def search(self, query: str, model: str = "gpt-4o") -> str:
         try:
-            response = await self.client.responses.create(
-                model=model,
-                tools=[{"type": "web_search_preview"}],
-                input=[
-                    {"role": "system", "content": "You are a web search assistant."},
-                    {"role": "user", "content": query}
-                ]
-            )
+            with span("llm.web_search", LLM_SECONDS, call="web_search", model=model):
+                response = await self.client.responses.create(
+                    model=model,
+                    tools=[{"type": "web_search_preview"}],
+                    input=[
+                        {"role": "system", "content": "You are a web search assistant."},
+                        {"role": "user", "content": query}
+                    ]
+                )
             return response.output_text
         except Exception as e:
             logging.error(f"Error during OpenAI request: {e}")
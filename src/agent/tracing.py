@@ -0,0 +1,193 @@
+import os
+import time
+import asyncio
+import bisect
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2.5, 5, 10, 20, 40, 90)
+# Finished turns kept for /stats/turns
+RECENT_TURNS = int(os.getenv("TREVOR_RECENT_TURNS", "100"))
+
+
+class Histogram:
+    """Cumulative latency histogram per label set, in the Prometheus text format."""
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, seconds: float, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, seconds)] += 1
+            series[-1] += seconds
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            labels = ",".join(f'{label}="{_escape(value)}"' for label, value in zip(self.labels, key))
+            count = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), values):
+                count += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{{{labels + ',' if labels else ''}{le}}} {count}")
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {values[-1]:.6f}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+TURN_PHASE = Histogram(
+    "trevor_turn_phase_seconds",
+    "Time from a response request to the first time each phase of the turn is reached",
+    ["phase", "model"],
+)
+TURN_SECONDS = Histogram("trevor_turn_seconds", "Whole turn, request to last chunk sent", ["outcome", "model"])
+LLM_FIRST_TOKEN = Histogram("trevor_llm_first_token_seconds", "Model call to its first streamed token", ["call", "model"])
+LLM_SECONDS = Histogram("trevor_llm_request_seconds", "Model call to its last token or full response", ["call", "model"])
+TOOL_SECONDS = Histogram("trevor_tool_seconds", "Tool run time", ["tool"])
+STORAGE_SECONDS = Histogram("trevor_storage_seconds", "User and transaction store operations in DBHandler", ["operation"])
+SEND_SECONDS = Histogram("trevor_websocket_send_seconds", "One websocket send to Retell")
+
+HISTOGRAMS = (TURN_PHASE, TURN_SECONDS, LLM_FIRST_TOKEN, LLM_SECONDS, TOOL_SECONDS, STORAGE_SECONDS, SEND_SECONDS)
+
+
+def render_metrics() -> str:
+    return "\n".join(line for histogram in HISTOGRAMS for line in histogram.render()) + "\n"
+
+
+class TurnTrace:
+    """Timeline of one response_id: when each phase was reached and where the time went.
+
+    Phases are points (first token, tool dispatch, last chunk, ...) measured
+    from the request; spans are timed operations (model calls, tools,
+    storage, sends) totalled by name, since a turn sends many chunks.
+    """
+
+    def __init__(self, call_id: str, response_id: int, model: str):
+        self.call_id = call_id
+        self.response_id = response_id
+        self.model = model
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.phases = {}  # phase -> seconds from the request, first occurrence only
+        self.spans = {}   # name -> [count, seconds]
+        self.outcome = None
+
+    def mark(self, phase: str):
+        if self.outcome is not None or phase in self.phases:
+            return
+        self.phases[phase] = time.perf_counter() - self.started
+        TURN_PHASE.observe(self.phases[phase], phase=phase, model=self.model)
+
+    def add_span(self, name: str, seconds: float):
+        if self.outcome is not None:
+            return  # e.g. a background summary that outlived the turn
+        totals = self.spans.setdefault(name, [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+
+    def finish(self, outcome: str):
+        if self.outcome is not None:
+            return
+        self.mark("last_chunk")
+        self.outcome = outcome
+        TURN_SECONDS.observe(self.phases["last_chunk"], outcome=outcome, model=self.model)
+        recent_turns.append(self)
+
+    def as_dict(self) -> dict:
+        return {
+            "call_id": self.call_id,
+            "response_id": self.response_id,
+            "started_at": self.started_at,
+            "outcome": self.outcome,
+            "phases": {phase: round(seconds, 4) for phase, seconds in self.phases.items()},
+            "spans": {name: {"count": count, "seconds": round(seconds, 4)} for name, (count, seconds) in self.spans.items()},
+        }
+
+    def __str__(self) -> str:
+        phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases.items())
+        spans = ", ".join(f"{name} {count}x {seconds:.2f}s" for name, (count, seconds) in self.spans.items())
+        return f"Turn {self.response_id} of {self.call_id} ({self.outcome}): {phases} | {spans}"
+
+
+recent_turns = deque(maxlen=RECENT_TURNS)
+
+# The turn being answered. Set in the task that streams the response, so every
+# task it creates (tools, prefetches, cache loads) inherits it.
+_current_turn = contextvars.ContextVar("current_turn", default=None)
+
+
+def start_turn(call_id: str, response_id: int, model: str) -> TurnTrace:
+    trace = TurnTrace(call_id, response_id, model)
+    _current_turn.set(trace)
+    return trace
+
+
+def mark(phase: str):
+    """Record that the current turn reached phase (no-op outside a turn)."""
+    trace = _current_turn.get()
+    if trace is not None:
+        trace.mark(phase)
+
+
+def record(name: str, histogram: Histogram, seconds: float, **labels):
+    """Add a timed operation to histogram and to the current turn's spans."""
+    histogram.observe(seconds, **labels)
+    trace = _current_turn.get()
+    if trace is not None:
+        trace.add_span(name, seconds)
+
+
+@contextmanager
+def span(name: str, histogram: Histogram, **labels):
+    """Time the block with record(). A cancelled block only counts towards the turn, not the histogram."""
+    started = time.perf_counter()
+    try:
+        yield
+    except (asyncio.CancelledError, GeneratorExit):
+        trace = _current_turn.get()
+        if trace is not None:
+            trace.add_span(name, time.perf_counter() - started)
+        raise
+    except BaseException:
+        record(name, histogram, time.perf_counter() - started, **labels)
+        raise
+    record(name, histogram, time.perf_counter() - started, **labels)
+
+
+class StreamTiming:
+    """Times one streamed model call: request to first token (also a turn phase) and to the last token."""
+
+    def __init__(self, call: str, model: str, first_token_phase: str):
+        self.call = call
+        self.model = model
+        self.first_token_phase = first_token_phase
+        self.requested = time.perf_counter()
+        self.first_token = None
+
+    def token(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter() - self.requested
+            record(f"llm.{self.call}.first_token", LLM_FIRST_TOKEN, self.first_token, call=self.call, model=self.model)
+            mark(self.first_token_phase)
+
+    def done(self):
+        record(f"llm.{self.call}", LLM_SECONDS, time.perf_counter() - self.requested, call=self.call, model=self.model)
@@ -1,44 +1,191 @@
-from flask import Flask, jsonify
+from flask import Flask, request
 import json
 import os
+import sys
+from datetime import datetime, timezone
 
 from flask_cors import CORS
 
+# The storage layer lives with the voice agent so both processes share it, including its
+# data paths (TREVOR_DATA_DIR, default trevorai-backend/data)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "agent"))
+from storage.cost_basis import LotLedger
+from storage.paths import (
+    HISTORY_DIR,
+    LIVE_QUOTES_PATH,
+    QUOTES_PATH,
+    SQLITE_PATH,
+    STORAGE_ENGINE,
+    TRANSACTION_JOURNAL_PATH,
+    TRANSACTION_PATH,
+    USER_DATA_PATH,
+)
+from storage.sqlite_store import get_sqlite_store
+from storage.transaction_journal import get_transaction_journal
+from storage.user_store import get_user_store
+from storage.valuation import PortfolioMatrix
+from tools.quote_provider import FileQuoteProvider, quote_provider_names
+
+from price_history import PriceHistory
+from response_cache import ResponseCache
+
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Next-Cursor"])
+
+if STORAGE_ENGINE == "sqlite":
+    user_store = transaction_journal = get_sqlite_store(SQLITE_PATH)
+else:
+    user_store = get_user_store(USER_DATA_PATH)
+    transaction_journal = get_transaction_journal(TRANSACTION_JOURNAL_PATH, TRANSACTION_PATH)
+
+response_cache = ResponseCache()
+portfolio_matrix = PortfolioMatrix(user_store)
+# Prices are the quotes the voice agent's refresher last fetched, each with its as-of time.
+# The quotes.json fixture only fills gaps when TREVOR_QUOTE_PROVIDERS opts into it.
+live_quotes = FileQuoteProvider(LIVE_QUOTES_PATH)
+quote_file = FileQuoteProvider(QUOTES_PATH)
+use_quote_file = "file" in quote_provider_names()
+cost_basis = LotLedger(transaction_journal)
+price_history = PriceHistory(HISTORY_DIR)
+
+def current_quotes():
+    quotes = quote_file.quotes() if use_quote_file else {}
+    quotes.update(live_quotes.quotes())
+    return quotes
+
+def quotes_version():
+    return (live_quotes.version(), quote_file.version() if use_quote_file else None)
 
-# Load the portfolio data
-DATA_PATH = os.path.join(os.path.dirname(__file__), "data", "user_data.json")
-# Load the transactions data
-TRANSACTION_PATH = os.path.join(os.path.dirname(__file__), "data", "user_transaction.json")
+def prices_as_of(quotes, symbols):
+    """{symbol: ISO time its price is valid as of} for the priced symbols"""
+    return {
+        symbol: datetime.fromtimestamp(quotes[symbol].timestamp, timezone.utc).isoformat(timespec="seconds")
+        for symbol in symbols
+        if symbol in quotes
+    }
 
 def load_portfolios():
-    with open(DATA_PATH, "r") as file:
-        return json.load(file)
+    return user_store.all()
     
 def load_transactions():
-    with open(TRANSACTION_PATH, "r") as file:
-        return json.load(file)
+    return list(transaction_journal.iter_transactions())
 
+def build_transaction_page(userid, args):
+    try:
+        limit = max(1, min(int(args.get("limit", 50)), 500))
+        cursor = args.get("cursor")
+        if cursor is not None:
+            int(cursor)
+    except ValueError:
+        return {"error": "limit and cursor must be integers"}, 400
+    transactions, next_cursor = transaction_journal.page(
+        userid,
+        limit=limit,
+        cursor=cursor,
+        since=args.get("since"),
+        until=args.get("until"),
+        symbol=args.get("symbol"),
+    )
+    return transactions, 200, ({"X-Next-Cursor": next_cursor} if next_cursor else {})
+
+# Without query parameters this returns the user's whole history, oldest first.
+# With any of limit/cursor/since/until/symbol it returns one page, newest first,
+# and the cursor for the next page in the X-Next-Cursor header.
 @app.route("/api/transactions/<userid>", methods=["GET"])
 def get_user_transactions(userid):
-    transactions = load_transactions()
-    user_transactions = [tx for tx in transactions if tx["userid"] == userid]
-    return jsonify(user_transactions)
+    if not request.args:
+        return response_cache.respond(
+            request,
+            ("transactions", userid),
+            transaction_journal.version(),
+            lambda: (list(transaction_journal.iter_transactions(userid)), 200),
+        )
+    args = request.args.to_dict()
+    return response_cache.respond(
+        request,
+        ("transactions", userid, tuple(sorted(args.items()))),
+        transaction_journal.version(),
+        lambda: build_transaction_page(userid, args),
+    )
 
-@app.route("/api/portfolio/<userid>", methods=["GET"])
-def get_user_portfolio(userid):
-    portfolios = load_portfolios()
-    user_portfolio = next((user for user in portfolios if user["userid"] == userid), None)
+def build_user_portfolio(userid):
+    user_portfolio = user_store.get(userid)
     if user_portfolio:
-        return jsonify(user_portfolio)
+        return user_portfolio, 200
     else:
-        return jsonify({"error": "User not found"}), 404
+        return {"error": "User not found"}, 404
+
+@app.route("/api/portfolio/<userid>", methods=["GET"])
+def get_user_portfolio(userid):
+    return response_cache.respond(request, ("portfolio", userid), user_store.version(), lambda: build_user_portfolio(userid))
 
 @app.route("/api/portfolios", methods=["GET"])
 def get_all_portfolios():
-    portfolios = load_portfolios()
-    return jsonify(portfolios)
+    return response_cache.respond(request, ("portfolios",), user_store.version(), lambda: (load_portfolios(), 200))
+
+def build_user_valuation(userid):
+    quotes = current_quotes()
+    valuation = portfolio_matrix.value_user(userid, {symbol: quote.price for symbol, quote in quotes.items()})
+    if valuation:
+        valuation["prices_as_of"] = prices_as_of(quotes, valuation["holdings"])
+        return valuation, 200
+    else:
+        return {"error": "User not found"}, 404
+
+def build_all_valuations():
+    quotes = current_quotes()
+    valuations = portfolio_matrix.value({symbol: quote.price for symbol, quote in quotes.items()})
+    valuations["prices_as_of"] = prices_as_of(quotes, valuations["exposure"])
+    return valuations, 200
+
+# Market value, cash and per-holding value/weight for one user, with the time each price is as of
+@app.route("/api/valuation/<userid>", methods=["GET"])
+def get_user_valuation(userid):
+    version = (user_store.version(), quotes_version())
+    return response_cache.respond(request, ("valuation", userid), version, lambda: build_user_valuation(userid))
+
+# Every user's market value plus the total exposure per symbol, valued in one pass
+@app.route("/api/valuations", methods=["GET"])
+def get_all_valuations():
+    version = (user_store.version(), quotes_version())
+    return response_cache.respond(request, ("valuations",), version, build_all_valuations)
+
+def build_user_pnl(userid, symbol):
+    user = user_store.get(userid)
+    if user is None:
+        return {"error": "User not found"}, 404
+    quotes = current_quotes()
+    report = cost_basis.report(userid, {key: quote.price for key, quote in quotes.items()}, user.get("portfolio"), symbol)
+    report["prices_as_of"] = prices_as_of(quotes, [key for key, entry in report["positions"].items() if "price" in entry])
+    return report, 200
+
+# FIFO cost basis and realized/unrealized P&L per symbol, with the time each price is as of;
+# ?symbol= limits it to one
+@app.route("/api/pnl/<userid>", methods=["GET"])
+def get_user_pnl(userid):
+    symbol = request.args.get("symbol")
+    version = (transaction_journal.version(), user_store.version(), quotes_version())
+    return response_cache.respond(request, ("pnl", userid, symbol), version, lambda: build_user_pnl(userid, symbol))
+
+def build_price_history(symbol, start, end, resample):
+    try:
+        history = price_history.query(symbol, start, end, resample)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    if history is None:
+        return {"error": "No history for symbol"}, 404
+    return history, 200
+
+# Daily bars from the local store; from/to are inclusive YYYY-MM-DD, resample is D, W or M
+@app.route("/api/history/<symbol>", methods=["GET"])
+def get_price_history(symbol):
+    args = (request.args.get("from"), request.args.get("to"), request.args.get("resample"))
+    return response_cache.respond(
+        request,
+        ("history", symbol.upper(), args),
+        price_history.version(symbol),
+        lambda: build_price_history(symbol, *args),
+    )
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8081, debug=True)
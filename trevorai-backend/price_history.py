@@ -0,0 +1,262 @@
+import os
+import re
+import csv
+import sys
+import json
+import logging
+import argparse
+import threading
+
+import numpy as np
+
+# The history lives in the shared data directory (TREVOR_DATA_DIR), like every other data file
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "agent"))
+from storage.paths import HISTORY_DIR
+
+# One raw little-endian file per column; row i of every file is the same day.
+# date is days since 1970-01-01 and is written last, so its length is the row count.
+COLUMNS = (
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("adjusted_close", "<f8"),
+    ("volume", "<i8"),
+    ("date", "<i4"),
+)
+RESAMPLE_PERIODS = ("D", "W", "M")
+
+_SYMBOL_PATTERN = re.compile(r"^[A-Z0-9.\-]{1,16}$")
+# Header spellings in CSV/JSON dumps -> column name
+_FIELD_ALIASES = {
+    "timestamp": "date",
+    "day": "date",
+    "adj_close": "adjusted_close",
+    "adjclose": "adjusted_close",
+}
+
+
+def _days(date: str) -> int:
+    return int(np.datetime64(date, "D").astype(np.int64))
+
+
+class PriceHistory:
+    """Daily OHLCV bars per symbol in append-only fixed-width column files.
+
+    Each symbol is a directory of COLUMNS files. Reads map them with
+    np.memmap, find the date range with a binary search on the date column
+    and slice the maps, so a range query copies nothing until the rows are
+    serialized. Maps are reopened only when the date file has grown.
+
+    Appends only add days after the last stored one, so re-running an
+    ingest is safe. There is meant to be one writer at a time (the ingest
+    command); readers never see a half-written row because the date column
+    is extended last.
+    """
+
+    def __init__(self, root_dir: str = HISTORY_DIR):
+        self.root_dir = root_dir
+        self._lock = threading.Lock()
+        self._maps = {}  # symbol -> (date file size, {column: memmap})
+
+    def _dir(self, symbol: str) -> str:
+        symbol = symbol.upper()
+        if not _SYMBOL_PATTERN.match(symbol):
+            raise ValueError(f"Invalid symbol '{symbol}'")
+        return os.path.join(self.root_dir, symbol)
+
+    def _rows(self, directory: str) -> int:
+        try:
+            return os.path.getsize(os.path.join(directory, "date")) // np.dtype("<i4").itemsize
+        except FileNotFoundError:
+            return 0
+
+    def version(self, symbol: str):
+        """Opaque value that changes whenever rows are appended for symbol."""
+        try:
+            stat = os.stat(os.path.join(self._dir(symbol), "date"))
+        except (FileNotFoundError, ValueError):
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def symbols(self) -> list:
+        try:
+            return sorted(name for name in os.listdir(self.root_dir) if self._rows(os.path.join(self.root_dir, name)))
+        except FileNotFoundError:
+            return []
+
+    def append(self, symbol: str, rows: list) -> int:
+        """Append rows ({"date": "YYYY-MM-DD", "close", ...}) after the last stored day. Returns rows written.
+
+        Rows for days already stored are skipped; within rows the last one
+        for a day wins. Missing open/high/low/adjusted_close default to
+        close and a missing volume to 0.
+        """
+        directory = self._dir(symbol)
+        os.makedirs(directory, exist_ok=True)
+        stored = self._rows(directory)
+        last_day = None
+        if stored:
+            last_day = int(np.fromfile(os.path.join(directory, "date"), dtype="<i4", offset=(stored - 1) * 4)[0])
+
+        by_day = {}
+        for row in rows:
+            day = _days(row["date"])
+            if last_day is None or day > last_day:
+                by_day[day] = row
+        if not by_day:
+            return 0
+        days = sorted(by_day)
+        values = {
+            "date": days,
+            "close": [float(by_day[day]["close"]) for day in days],
+            "volume": [int(float(by_day[day].get("volume") or 0)) for day in days],
+        }
+        for column in ("open", "high", "low", "adjusted_close"):
+            values[column] = [
+                float(by_day[day][column]) if by_day[day].get(column) not in (None, "") else float(by_day[day]["close"])
+                for day in days
+            ]
+
+        for column, dtype in COLUMNS:
+            path = os.path.join(directory, column)
+            with open(path, "ab") as f:
+                # Drop the tail of a column left longer than date by an interrupted append
+                f.truncate(stored * np.dtype(dtype).itemsize)
+                f.write(np.asarray(values[column], dtype=dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        return len(days)
+
+    def _columns(self, symbol: str):
+        """{column: memmap} over every stored row of symbol, or None if there are none."""
+        directory = self._dir(symbol)
+        rows = self._rows(directory)
+        if not rows:
+            return None
+        key = symbol.upper()
+        with self._lock:
+            cached = self._maps.get(key)
+            if cached is not None and cached[0] == rows:
+                return cached[1]
+            maps = {
+                column: np.memmap(os.path.join(directory, column), dtype=dtype, mode="r", shape=(rows,))
+                for column, dtype in COLUMNS
+            }
+            self._maps[key] = (rows, maps)
+            return maps
+
+    def query(self, symbol: str, start: str = None, end: str = None, resample: str = None):
+        """Bars for symbol between start and end (inclusive YYYY-MM-DD), or None if nothing is stored.
+
+        resample is "D" (default), "W" (weeks from Monday) or "M" (calendar
+        months); a resampled bar opens at the first day, closes at the last,
+        takes the high/low over the period, sums volume and is dated by its
+        last trading day. Columns are returned as parallel lists.
+        """
+        resample = (resample or "D").upper()
+        if resample not in RESAMPLE_PERIODS:
+            raise ValueError(f"resample must be one of {', '.join(RESAMPLE_PERIODS)}")
+        maps = self._columns(symbol)
+        if maps is None:
+            return None
+
+        dates = maps["date"]
+        lo = np.searchsorted(dates, _days(start), side="left") if start else 0
+        hi = np.searchsorted(dates, _days(end), side="right") if end else len(dates)
+        bars = {column: maps[column][lo:hi] for column, _ in COLUMNS}  # views into the maps
+
+        if resample != "D" and hi > lo:
+            days = bars["date"]
+            if resample == "W":
+                periods = (days.astype(np.int64) + 3) // 7  # 1970-01-01 was a Thursday
+            else:
+                periods = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+            starts = np.flatnonzero(np.concatenate(([True], periods[1:] != periods[:-1])))
+            ends = np.concatenate((starts[1:], [len(days)])) - 1
+            bars = {
+                "date": days[ends],
+                "open": bars["open"][starts],
+                "high": np.maximum.reduceat(bars["high"], starts),
+                "low": np.minimum.reduceat(bars["low"], starts),
+                "close": bars["close"][ends],
+                "adjusted_close": bars["adjusted_close"][ends],
+                "volume": np.add.reduceat(bars["volume"], starts),
+            }
+
+        result = {"symbol": symbol.upper(), "resample": resample, "from": start, "to": end}
+        result["date"] = bars["date"].astype("datetime64[D]").astype(str).tolist()
+        for column, _ in COLUMNS[:-1]:
+            result[column] = bars[column].tolist()
+        return result
+
+
+def _normalize_field(name: str) -> str:
+    # "5. adjusted close" (AlphaVantage), "Adj Close" (Yahoo) -> adjusted_close
+    name = re.sub(r"^\d+\.\s*", "", name.strip()).lower().replace(" ", "_")
+    return _FIELD_ALIASES.get(name, name)
+
+
+def _normalize_row(row: dict) -> dict:
+    return {_normalize_field(key): value for key, value in row.items() if key is not None}
+
+
+def read_dump(path: str, symbol: str = None) -> dict:
+    """{SYMBOL: [rows]} from a CSV or JSON price dump.
+
+    CSV needs a header with date and close (plus any of open, high, low,
+    adjusted_close, volume and symbol). JSON is either an AlphaVantage
+    TIME_SERIES_* response or a list of such rows. Rows without a symbol
+    belong to symbol, then the AlphaVantage metadata, then the file name.
+    """
+    default_symbol = symbol or os.path.splitext(os.path.basename(path))[0]
+    if path.lower().endswith(".json"):
+        with open(path, "r") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            meta = _normalize_row(data.get("Meta Data", {}))
+            default_symbol = symbol or meta.get("symbol") or default_symbol
+            series = next((value for key, value in data.items() if "Time Series" in key), None)
+            if series is None:
+                raise ValueError(f"{path}: no time series found")
+            rows = [{"date": date, **_normalize_row(values)} for date, values in series.items()]
+        else:
+            rows = [_normalize_row(row) for row in data]
+    else:
+        with open(path, "r", newline="") as f:
+            rows = [_normalize_row(row) for row in csv.DictReader(f)]
+
+    by_symbol = {}
+    for row in rows:
+        if not row.get("date") or row.get("close") in (None, ""):
+            continue
+        row["date"] = str(row["date"])[:10]
+        by_symbol.setdefault(str(row.get("symbol") or default_symbol).upper(), []).append(row)
+    return by_symbol
+
+
+def ingest(history: PriceHistory, paths: list, symbol: str = None) -> dict:
+    """Load dumps into history with one append per symbol. Returns {symbol: rows written}."""
+    pending = {}
+    for path in paths:
+        for key, rows in read_dump(path, symbol).items():
+            pending.setdefault(key, []).extend(rows)
+    return {key: history.append(key, rows) for key, rows in pending.items()}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Bulk load daily price dumps (CSV or JSON) into the price history store.")
+    parser.add_argument("paths", nargs="+", help="CSV or JSON files")
+    parser.add_argument("--symbol", help="Symbol for rows that don't name one (default: from the file)")
+    parser.add_argument("--dir", default=HISTORY_DIR, help="History directory")
+    args = parser.parse_args()
+    try:
+        result = ingest(PriceHistory(args.dir), args.paths, args.symbol)
+    except (OSError, ValueError, KeyError) as e:
+        logging.error(f"Ingest failed: {e}")
+        sys.exit(1)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
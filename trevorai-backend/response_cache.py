@@ -0,0 +1,62 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response
+
+
+class ResponseCache:
+    """Serialized JSON responses keyed by endpoint, rebuilt only when the data version changes.
+
+    Every response carries an ETag of its content, so the dashboard's
+    polling is mostly answered with 304 Not Modified and no serialization.
+    There is no Last-Modified: data versions are opaque and the build time
+    is not when the data changed, so it would make clients skip real changes.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (version, (body, status, headers, etag))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version, build):
+        """Return (body, status, headers, etag) for key.
+
+        build() returns (data, status) or (data, status, extra headers).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        data, status, *headers = build()
+        headers = headers[0] if headers else {}
+        body = json.dumps(data)
+        etag = hashlib.sha1((body + json.dumps(headers, sort_keys=True)).encode("utf-8")).hexdigest()[:20]
+        cached = (body, status, headers, etag)
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (version, cached)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return cached
+
+    def respond(self, request, key, version, build) -> Response:
+        """Cached response for key, or 304 if the client's If-None-Match still holds.
+
+        Only successful responses are validated; errors never get an ETag or a 304.
+        """
+        body, status, headers, etag = self.get(key, version, build)
+        response = Response(body, status=status, headers=headers, mimetype="application/json")
+        if not 200 <= status < 300:
+            return response
+        response.set_etag(etag)
+        response.cache_control.no_cache = True  # always revalidate, which is what makes the 304s possible
+        return response.make_conditional(request)
@@ -11,6 +11,42 @@ export async function GET(req: Request) {
     return NextResponse.json({ error: "Missing symbol" }, { status: 400 });
   }
 
+  // Serve ingested symbols from the backend's price history, in AlphaVantage's shape.
+  // 150 calendar days covers the 100 trading days of outputsize=compact without reading the whole history.
+  const from = new Date();
+  from.setDate(from.getDate() - 150);
+  try {
+    const local = await fetch(
+      `http://127.0.0.1:8081/api/history/${encodeURIComponent(symbol)}?from=${from.toISOString().slice(0, 10)}`
+    );
+    const history = local.ok ? await local.json() : null;
+    if (history && history.date.length > 0) {
+      const start = Math.max(0, history.date.length - 100); // outputsize=compact
+      const series: Record<string, Record<string, string>> = {};
+      for (let i = history.date.length - 1; i >= start; i--) {
+        series[history.date[i]] = {
+          "1. open": String(history.open[i]),
+          "2. high": String(history.high[i]),
+          "3. low": String(history.low[i]),
+          "4. close": String(history.close[i]),
+          "5. adjusted close": String(history.adjusted_close[i]),
+          "6. volume": String(history.volume[i]),
+        };
+      }
+      return NextResponse.json({
+        "Meta Data": {
+          "1. Information": "Daily Time Series with Splits and Dividend Events",
+          "2. Symbol": history.symbol,
+          "3. Last Refreshed": history.date[history.date.length - 1],
+          "4. Output Size": "Compact",
+        },
+        "Time Series (Daily)": series,
+      });
+    }
+  } catch (error) {
+    console.error("Local price history unavailable", error);
+  }
+
   const url = `https://www.alphavantage.co/query?function=TIME_SERIES_DAILY_ADJUSTED&symbol=${symbol}&outputsize=compact&apikey=${apiKey}`;
 
   try {
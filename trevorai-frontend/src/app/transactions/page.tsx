@@ -16,22 +16,44 @@ interface Transaction {
   initiator: 'user' | 'agent';
 }
 
+const PAGE_SIZE = 50;
+
 export default function TransactionsPage() {
   const { selectedUser } = useUser(); // <-- Get selected user
   const [transactions, setTransactions] = useState<Transaction[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // Newest-first page of the user's history; cursor points just past the previous page
+  async function fetchPage(cursor: string | null) {
+    const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+    if (cursor) params.set('cursor', cursor);
+    const res = await fetch(`http://127.0.0.1:8081/api/transactions/${selectedUser.userid}?${params}`);
+    const data: Transaction[] = await res.json();
+    return { data, cursor: res.headers.get('X-Next-Cursor') };
+  }
 
   useEffect(() => {
     async function fetchTransactions() {
       setLoading(true);
-      const res = await fetch(`http://127.0.0.1:8081/api/transactions/${selectedUser.userid}`);
-      const data = await res.json();
-      setTransactions(data);
+      const page = await fetchPage(null);
+      setTransactions(page.data);
+      setNextCursor(page.cursor);
       setLoading(false);
     }
     fetchTransactions();
   }, [selectedUser]); // 🛠️ refetch whenever selectedUser changes
 
+  async function loadMore() {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    const page = await fetchPage(nextCursor);
+    setTransactions((prev) => [...prev, ...page.data]);
+    setNextCursor(page.cursor);
+    setLoadingMore(false);
+  }
+
   const groupedTransactions = transactions.reduce((acc, transaction) => {
     const monthYear = format(new Date(transaction.date), 'MMMM yyyy');
     if (!acc[monthYear]) {
@@ -97,6 +119,18 @@ export default function TransactionsPage() {
           </div>
         ))}
       </div>
+
+      {nextCursor && (
+        <div className="flex justify-center mt-6">
+          <button
+            onClick={loadMore}
+            disabled={loadingMore}
+            className="px-4 py-2 text-sm rounded-md border bg-card hover:bg-muted/50 disabled:opacity-50"
+          >
+            {loadingMore ? 'Loading...' : 'Load older transactions'}
+          </button>
+        </div>
+      )}
     </div>
   );
 }
@@ -27,8 +27,8 @@ export const StockDetailGraph = ({ stock }: StockDetailGraphProps) => {
   
   useEffect(() => {
     async function fetchStockHistory() {
-      const { getStockHistoryAlphaVantage } = await import('@/lib/alphavantage');
-      const data = await getStockHistoryAlphaVantage(stock.name);
+      const { getStockHistory } = await import('@/lib/history');
+      const data = await getStockHistory(stock.name);
       setHistoryData(data);
     }
     fetchStockHistory();
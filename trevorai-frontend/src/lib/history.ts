@@ -0,0 +1,25 @@
+// Daily closes from the backend's local price history, so charts don't spend AlphaVantage quota.
+// Symbols that haven't been ingested yet (see trevorai-backend/price_history.py), or have no bars in the
+// requested range, fall back to AlphaVantage.
+const BACKEND_URL = "http://127.0.0.1:8081";
+
+export async function getStockHistory(symbol: string, months = 12): Promise<{ date: string, value: number }[]> {
+  const from = new Date();
+  from.setMonth(from.getMonth() - months);
+  const params = new URLSearchParams({ from: from.toISOString().slice(0, 10), resample: "M" });
+
+  try {
+    const res = await fetch(`${BACKEND_URL}/api/history/${encodeURIComponent(symbol)}?${params}`);
+    if (res.ok) {
+      const data = await res.json();
+      if (data.date.length > 0) {
+        return data.date.map((date: string, i: number) => ({ date, value: data.close[i] }));
+      }
+    }
+  } catch (error) {
+    console.error("Failed to fetch stock history from the backend", error);
+  }
+
+  const { getStockHistoryAlphaVantage } = await import('@/lib/alphavantage');
+  return getStockHistoryAlphaVantage(symbol);
+}